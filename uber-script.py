@@ -10,11 +10,13 @@ IMPORTANT: Before running this script:
 4. Configure your address keywords in the 'config.json' file (will be created automatically on first run)
 
 Usage:
-    python uber-script.py [month]
+    python uber-script.py [month] [--reuse-trips]
     
     month: Optional integer (1-12) for the month to fetch data for.
            If not provided, uses the previous month.
            For December (12), uses the previous year.
+    --reuse-trips: Rebuild the report from the month's saved trips.json
+                   without calling the Uber API.
 
 The script will:
 - Fetch trip data from Uber's GraphQL API for the specified month
@@ -26,28 +28,47 @@ For detailed instructions, see README.md
 """
 
 # Standard library imports
+import atexit
+import hashlib
+import io
 import json
+import mmap
 import os
 import re
 import shutil
+import sqlite3
 import sys
+import threading
 import zipfile
 from calendar import monthrange
-from datetime import datetime, timedelta, timezone
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from email.utils import parseaddr
+from functools import lru_cache
 
 # Third-party imports
-import pandas as pd
 import requests
 import time
 from openpyxl import load_workbook
-from PyPDF2 import PdfMerger
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pypdf import PdfReader, PdfWriter
 
 try:
     from redmail import EmailSender
 except ImportError:
     EmailSender = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
 # ============================================================================
 # CONSTANTS AND CONFIGURATION
 # ============================================================================
@@ -55,6 +76,170 @@ except ImportError:
 # API Configuration
 UBER_GRAPHQL_URL = "https://riders.uber.com/graphql"
 
+# Number of trips fetched in parallel (bounded to respect Uber rate limits)
+MAX_TRIP_WORKERS = 10
+
+# Receipt PDFs parsed in parallel before merging (pikepdf releases the GIL while parsing)
+MAX_PDF_PARSE_WORKERS = os.cpu_count() or 4
+
+# Requests per second sent to Uber across all workers (replaces a fixed sleep per trip)
+UBER_REQUESTS_PER_SECOND = 8
+
+# Keep-alive connections kept open to Uber (at least one per trip worker)
+HTTP_POOL_SIZE = 20
+
+# Chunk size used when streaming receipt PDFs to disk
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Sidecar written next to the merged receipts PDF to detect unchanged re-runs
+RECEIPTS_MANIFEST_SUFFIX = ".manifest"
+
+# Zstandard ZIP entries (Python 3.14+); None on older interpreters, which fall back to DEFLATE
+ZIP_ZSTANDARD = getattr(zipfile, "ZIP_ZSTANDARD", None)
+
+# Files that are already compressed and are stored in the report ZIP without recompressing
+ZIP_STORED_EXTENSIONS = (".pdf", ".xlsx", ".zip", ".png", ".jpg", ".jpeg")
+
+# email_config fields that must be filled in before an email can be sent
+EMAIL_REQUIRED_FIELDS = ('recipient_email', 'sender_email', 'sender_password', 'smtp_server', 'smtp_port')
+
+# Default email templates (subject and body can be overridden in config.json)
+DEFAULT_SUBJECT_TEMPLATE = "Uber Trip Report - {month_year}"
+DEFAULT_BODY_TEMPLATE = (
+    "Please find attached the Uber trip report for {month_year}.\n\n"
+    "Total amount: ${total_amount:.2f}\n"
+    "Number of trips: {trip_count}\n\n"
+    "Best regards,\n"
+    "Uber Trip Exporter"
+)
+DEFAULT_HTML_TEMPLATE = """
+        <html>
+        <body>
+            <h2>Uber Trip Report - {month_year}</h2>
+            <p>Please find attached the Uber trip report for <strong>{month_year}</strong>.</p>
+            <ul>
+                <li><strong>Total amount:</strong> ${total_amount:.2f}</li>
+                <li><strong>Number of trips:</strong> {trip_count}</li>
+            </ul>
+            <p>Best regards,<br>Uber Trip Exporter</p>
+        </body>
+        </html>
+        """
+
+# Number of trips whose GraphQL operations are sent in one batched request
+GRAPHQL_BATCH_SIZE = 25
+
+# Send queries as Automatic Persisted Query (APQ) hashes once the server has seen the full text.
+# Off by default: Uber's endpoint has not been confirmed to accept hashes
+GRAPHQL_PERSISTED_QUERIES = False
+
+# Trip price in the activity description (e.g. "EGP 123.45")
+PRICE_RE = re.compile(r"([0-9]+(?:\.[0-9]+)?)")
+
+# Trip subtitle formats: "Aug 31 • 4:29 PM" (no year, "•" stripped) and "Aug 31, 2025, 10:15 AM"
+SUBTITLE_DATE_RE = re.compile(
+    r"([A-Za-z]{3})\s+(\d{1,2})(?:,\s*(\d{4}),)?\s+(\d{1,2}):(\d{2})\s*([AaPp][Mm])"
+)
+
+# English month abbreviations used in subtitles (independent of the system locale, unlike strptime's %b)
+MONTH_NUMBERS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
+
+# Year applied to subtitles without one, read once per run
+CURRENT_YEAR = datetime.now().year
+
+# On-disk GraphQL response cache (stored next to the script); the oldest rows beyond the limit
+# are deleted once per run, together with expired ones
+GRAPHQL_CACHE_FILE = ".graphql_cache.sqlite"
+GRAPHQL_CACHE_MAX_ROWS = 5000
+
+# Receipt PDFs kept between runs (stored next to the script), so re-runs skip the download;
+# the least recently used files beyond the limit are deleted
+RECEIPT_CACHE_DIR = ".receipt_cache"
+RECEIPT_CACHE_MAX_FILES = 500
+
+# Cache lifetime per operation in seconds - None means cached forever
+# (trip details and receipts never change once a trip is finished)
+GRAPHQL_CACHE_TTL = {
+    "Activities": 300,
+    "GetTrip": None,
+    "GetReceipt": None,
+}
+
+# Trip list query - only the fields the script reads
+ACTIVITIES_QUERY = """
+query Activities(
+  $cityID: Int
+  $endTimeMs: Float
+  $includePast: Boolean = true
+  $limit: Int = 60
+  $nextPageToken: String
+  $orderTypes: [RVWebCommonActivityOrderType!] = [RIDES, TRAVEL]
+  $profileType: RVWebCommonActivityProfileType = PERSONAL
+  $startTimeMs: Float
+) {
+  activities(cityID: $cityID) {
+    past(
+      endTimeMs: $endTimeMs
+      limit: $limit
+      nextPageToken: $nextPageToken
+      orderTypes: $orderTypes
+      profileType: $profileType
+      startTimeMs: $startTimeMs
+    ) @include(if: $includePast) {
+      activities {
+        uuid
+        cardURL
+        description
+        subtitle
+      }
+      nextPageToken
+    }
+  }
+}
+"""
+
+# Details of a single trip (pickup & dropoff)
+TRIP_DETAILS_QUERY = """
+query GetTrip($tripUUID: String!) {
+  getTrip(tripUUID: $tripUUID) {
+    trip {
+      uuid
+      waypoints
+    }
+  }
+}
+"""
+
+# Receipt queries - only the fields the script reads
+RECEIPT_TIMESTAMP_QUERY = """
+query GetReceipt($tripUUID: String!, $timestamp: String) {
+  getReceipt(tripUUID: $tripUUID, timestamp: $timestamp) {
+    receiptsForJob {
+      timestamp
+    }
+  }
+}
+"""
+
+RECEIPT_QUERY = """
+query GetReceipt($tripUUID: String!, $timestamp: String) {
+  getReceipt(tripUUID: $tripUUID, timestamp: $timestamp) {
+    receiptData
+  }
+}
+"""
+
+# Root field and selection of the prefetched operations (same fields as TRIP_DETAILS_QUERY and
+# RECEIPT_TIMESTAMP_QUERY), used to combine many of them into one aliased query
+ALIASED_OPERATIONS = {
+    "GetTrip": ("getTrip", "{ trip { uuid waypoints } }"),
+    "GetReceipt": ("getReceipt", "{ receiptsForJob { timestamp } }"),
+}
+ALIASED_VARIABLE_TYPES = {"tripUUID": "String!", "timestamp": "String"}
+
 # Console colors for better logging
 class Colors:
     HEADER = '\033[95m'
@@ -66,6 +251,9 @@ class Colors:
     ENDC = '\033[0m'
     BOLD = '\033[1m'
 
+# Worker threads log concurrently - one lock keeps each line intact
+_log_lock = threading.Lock()
+
 def log(message, level="INFO"):
     """Enhanced console logging with colors and timestamps"""
     timestamp = datetime.now().strftime("%H:%M:%S")
@@ -83,17 +271,42 @@ def log(message, level="INFO"):
     else:
         color = Colors.ENDC
     
-    print(f"{color}[{timestamp}] {level}: {message}{Colors.ENDC}")
+    with _log_lock:
+        print(f"{color}[{timestamp}] {level}: {message}{Colors.ENDC}")
 
 def log_progress(current, total, message="Processing"):
-    """Show progress with percentage"""
+    """Show progress with percentage (at most one line per whole percent for long runs)"""
+    if total > 100 and current not in (1, total) and (current * 100) // total == ((current - 1) * 100) // total:
+        return
     percentage = (current / total) * 100 if total > 0 else 0
-    print(f"{Colors.BLUE}[{datetime.now().strftime('%H:%M:%S')}] PROGRESS: {message} [{current}/{total}] ({percentage:.1f}%){Colors.ENDC}")
+    with _log_lock:
+        print(f"{Colors.BLUE}[{datetime.now().strftime('%H:%M:%S')}] PROGRESS: {message} [{current}/{total}] ({percentage:.1f}%){Colors.ENDC}")
 
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
 
+def encode_json(data):
+    """Serialize data to JSON bytes (uses orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode("utf-8")
+
+def decode_json(raw):
+    """Parse JSON from bytes or str (uses orjson when installed)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def write_json_file(file_path, data):
+    """Write data to a UTF-8 JSON file with 2-space indentation."""
+    if orjson is not None:
+        with open(file_path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
 def get_month_date_range(month=None):
     """
     Calculate start and end timestamps for a given month.
@@ -151,25 +364,36 @@ def get_month_date_range(month=None):
     return start_timestamp_ms, end_timestamp_ms, month_year_string
 
 def parse_command_line_args():
-    """Parse command line arguments for month parameter."""
+    """
+    Parse command line arguments for month parameter and options.
+
+    Returns:
+        tuple: (month, reuse_trips) - month is None if not provided
+    """
     log("Parsing command line arguments", "INFO")
     
-    if len(sys.argv) > 1:
+    args = sys.argv[1:]
+    reuse_trips = "--reuse-trips" in args
+    if reuse_trips:
+        args.remove("--reuse-trips")
+        log("Reusing saved trip data, the Uber API will not be called", "INFO")
+    
+    if args:
         try:
-            month = int(sys.argv[1])
+            month = int(args[0])
             if not 1 <= month <= 12:
                 log("Month must be between 1 and 12", "ERROR")
                 sys.exit(1)
             log(f"Month parameter provided: {month}", "SUCCESS")
-            return month
+            return month, reuse_trips
         except ValueError:
             log("Invalid month parameter. Must be an integer between 1 and 12", "ERROR")
-            log("Usage: python uber-script.py [month]", "INFO")
+            log("Usage: python uber-script.py [month] [--reuse-trips]", "INFO")
             log("Example: python uber-script.py 7  (for July)", "INFO")
             sys.exit(1)
     else:
         log("No month parameter provided, will use previous month", "INFO")
-        return None
+        return None, reuse_trips
 
 # ============================================================================
 # CONFIGURATION AND DATA LOADING FUNCTIONS
@@ -179,28 +403,44 @@ def read_token_from_file(file_path="token.txt"):
     """
     Read the authentication token/cookie from a text file.
     The file should contain the cookie string without quotes.
+    The token is cached until the file's modification time changes, so repeated
+    calls only re-read the file after it has been replaced (main() reads it once per run).
+
+    Raises:
+        RuntimeError: If the token file is missing, empty or unreadable
     """
-    log(f"Reading authentication token from {file_path}", "INFO")
+    # Get the directory where the script is located
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    token_file_path = os.path.join(script_dir, file_path)
     
     try:
-        # Get the directory where the script is located
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        token_file_path = os.path.join(script_dir, file_path)
-        
-        with open(token_file_path, 'r', encoding='utf-8') as file:
-            token = file.read().strip()
-            if not token:
-                raise ValueError("Token file is empty")
-            log("Authentication token loaded successfully", "SUCCESS")
-            return token
+        mtime_ns = os.stat(token_file_path).st_mtime_ns
     except FileNotFoundError:
         log(f"{file_path} not found in the script directory", "ERROR")
         log(f"Please create a '{file_path}' file with your authentication cookie", "ERROR")
         log("You can copy the cookie from your browser's developer tools", "INFO")
-        exit(1)
-    except Exception as e:
+        raise RuntimeError(f"{file_path} not found in the script directory")
+    
+    return _load_token(token_file_path, mtime_ns)
+
+@lru_cache(maxsize=1)
+def _load_token(token_file_path, mtime_ns):
+    """Read the token file; cached per (path, mtime) by read_token_from_file()."""
+    log(f"Reading authentication token from {os.path.basename(token_file_path)}", "INFO")
+    
+    try:
+        with open(token_file_path, 'r', encoding='utf-8') as file:
+            token = file.read().strip()
+    except OSError as e:
         log(f"Error reading token file: {e}", "ERROR")
-        exit(1)
+        raise RuntimeError(f"Error reading token file: {e}") from e
+    
+    if not token:
+        log("Error reading token file: Token file is empty", "ERROR")
+        raise RuntimeError("Token file is empty")
+    
+    log("Authentication token loaded successfully", "SUCCESS")
+    return token
 
 def read_config_from_file(file_path="config.json", return_full_config=False):
     """
@@ -222,8 +462,8 @@ def read_config_from_file(file_path="config.json", return_full_config=False):
         script_dir = os.path.dirname(os.path.abspath(__file__))
         config_file_path = os.path.join(script_dir, file_path)
         
-        with open(config_file_path, 'r', encoding='utf-8') as file:
-            config = json.load(file)
+        # A missing file raises FileNotFoundError here, handled below
+        config = _load_config(config_file_path, os.stat(config_file_path).st_mtime_ns)
             
         # Validate required keys
         if 'home_address_keywords' not in config or 'work_address_keywords' not in config:
@@ -270,8 +510,11 @@ def read_config_from_file(file_path="config.json", return_full_config=False):
                 "sender_password": "your-app-password",
                 "smtp_server": "smtp.gmail.com",
                 "smtp_port": 587,
-                "subject_template": "Uber Trip Report - {month_year}",
-                "body_template": "Please find attached the Uber trip report for {month_year}.\n\nTotal amount: ${total_amount}\nNumber of trips: {trip_count}\n\nBest regards,\nUber Trip Exporter"
+                "zip_compression": "deflate",
+                "zip_compress_level": 1,
+                "send_html": True,
+                "subject_template": DEFAULT_SUBJECT_TEMPLATE,
+                "body_template": DEFAULT_BODY_TEMPLATE
             },
             "_instructions": {
                 "description": "Update the keyword lists above with parts of your addresses that are consistent",
@@ -309,8 +552,7 @@ def read_config_from_file(file_path="config.json", return_full_config=False):
         }
         
         # Save default config
-        with open(config_file_path, 'w', encoding='utf-8') as file:
-            json.dump(default_config, file, ensure_ascii=False, indent=2)
+        write_json_file(config_file_path, default_config)
             
         log(f"Created default config file: {file_path}", "SUCCESS")
         log(f"Please update the keywords in {file_path} with your actual address keywords", "WARNING")
@@ -326,10 +568,330 @@ def read_config_from_file(file_path="config.json", return_full_config=False):
         log(f"Error reading config file: {e}", "ERROR")
         exit(1)
 
+@lru_cache(maxsize=4)
+def _load_config(config_file_path, mtime_ns):
+    """
+    Parse the config file; cached per (path, mtime) by read_config_from_file().
+    The returned dict is shared between callers, so treat it as read-only.
+    """
+    with open(config_file_path, 'rb') as file:
+        return decode_json(file.read())
+
+# ============================================================================
+# RESPONSE CACHE FUNCTIONS
+# ============================================================================
+
+# Worker threads share the cache file; "scope" ties entries to the account's cookie
+_graphql_cache_lock = threading.Lock()
+_graphql_cache_state = {"scope": "", "pruned": False}
+
+def set_graphql_cache_scope(cookie):
+    """Scope cached responses to the cookie in use, so another account never gets them."""
+    _graphql_cache_state["scope"] = hashlib.sha256(cookie.encode("utf-8")).hexdigest()
+
+def _graphql_cache_key(operation, variables):
+    """Build a stable cache key from the cookie scope, the operation name and its variables."""
+    # Stdlib json on purpose: keys must not change when orjson is installed or removed
+    raw = json.dumps([_graphql_cache_state["scope"], operation, variables], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _prune_graphql_cache(conn):
+    """Delete expired rows and keep only the newest GRAPHQL_CACHE_MAX_ROWS."""
+    now = time.time()
+    with conn:
+        deleted = 0
+        for operation, ttl in GRAPHQL_CACHE_TTL.items():
+            if ttl is not None:
+                deleted += conn.execute(
+                    "DELETE FROM responses WHERE operation = ? AND created < ?", (operation, now - ttl)
+                ).rowcount
+        deleted += conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (GRAPHQL_CACHE_MAX_ROWS,),
+        ).rowcount
+    if deleted:
+        log(f"Removed {deleted} expired or old entries from the response cache", "INFO")
+
+def _open_graphql_cache():
+    """Open (and create if needed) the SQLite response cache next to the script."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    conn = sqlite3.connect(os.path.join(script_dir, GRAPHQL_CACHE_FILE))
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "key TEXT PRIMARY KEY, operation TEXT, created REAL, body TEXT)"
+    )
+    # Called with _graphql_cache_lock held, so only the first open of the run prunes
+    if not _graphql_cache_state["pruned"]:
+        _graphql_cache_state["pruned"] = True
+        _prune_graphql_cache(conn)
+    return conn
+
+def get_cached_response(operation, variables):
+    """
+    Look up a cached GraphQL response.
+
+    Args:
+        operation (str): GraphQL operation name
+        variables (dict): Variables the operation was sent with
+
+    Returns:
+        dict: Cached response body, or None if missing or expired
+    """
+    key = _graphql_cache_key(operation, variables)
+
+    try:
+        with _graphql_cache_lock:
+            conn = _open_graphql_cache()
+            try:
+                row = conn.execute("SELECT created, body FROM responses WHERE key = ?", (key,)).fetchone()
+            finally:
+                conn.close()
+    except sqlite3.Error as e:
+        log(f"Response cache unavailable: {e}", "WARNING")
+        return None
+
+    if row is None:
+        return None
+
+    created, body = row
+    ttl = GRAPHQL_CACHE_TTL.get(operation)
+    if ttl is not None and time.time() - created > ttl:
+        return None
+
+    return decode_json(body)
+
+def _is_complete_response(operation, response):
+    """
+    Check that a response holds the data the script needs, not just a non-empty "data".
+
+    Trip details and receipts are cached forever, so an empty result (e.g. a receipt that
+    is not generated yet) must not be stored or the trip would never be fetched again.
+    """
+    if not isinstance(response, dict) or not response.get("data") or response.get("errors"):
+        return False
+
+    data = response["data"]
+    if operation == "GetTrip":
+        trip = (data.get("getTrip") or {}).get("trip") or {}
+        return bool(trip.get("waypoints"))
+    if operation == "GetReceipt":
+        receipt = data.get("getReceipt") or {}
+        return bool(receipt.get("receiptsForJob") or receipt.get("receiptData"))
+    return True
+
+def store_cached_response(operation, variables, response):
+    """Store a successful GraphQL response in the on-disk cache."""
+    # Never cache errors or empty results - they should be retried next run
+    if not _is_complete_response(operation, response):
+        return
+
+    key = _graphql_cache_key(operation, variables)
+
+    try:
+        with _graphql_cache_lock:
+            conn = _open_graphql_cache()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses (key, operation, created, body) VALUES (?, ?, ?, ?)",
+                        (key, operation, time.time(), encode_json(response)),
+                    )
+            finally:
+                conn.close()
+    except sqlite3.Error as e:
+        log(f"Could not write to response cache: {e}", "WARNING")
+
 # ============================================================================
 # API FUNCTIONS
 # ============================================================================
 
+def create_http_session():
+    """
+    Create a requests session shared by all Uber API calls.
+    Reuses keep-alive connections (no TLS handshake per request) and retries
+    transient failures such as rate limiting and gateway errors.
+    """
+    session = requests.Session()
+    session.headers.update({
+        "content-type": "application/json",
+        "Cache-Control": "no-cache",
+        "User-Agent": "PostmanRuntime/7.45.0",
+        "origin": "https://riders.uber.com",
+        "x-csrf-token": "x",
+    })
+    retries = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"],  # GraphQL queries are read-only, safe to retry (urllib3 >= 1.26)
+        respect_retry_after_header=True,  # On 429/503, wait as long as Uber asks
+        raise_on_status=False,  # Return the last response so callers can log the status
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries)
+    session.mount("https://", adapter)
+    return session
+
+HTTP_SESSION = create_http_session()
+
+class RateLimiter:
+    """
+    Token bucket shared by the worker threads: up to `rate` requests per second, bursts up to `burst`.
+    The rate adapts to Uber's responses: halved on HTTP 429, recovering gradually on success.
+    """
+
+    def __init__(self, rate, burst, min_rate=1.0):
+        self._max_rate = rate
+        self._min_rate = min_rate
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until it is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            # Going negative reserves a future token, so waiting threads are spaced 1/rate apart
+            self._tokens -= 1
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+    def record(self, response):
+        """Adjust the rate from a response, including 429s that urllib3 already retried."""
+        retries = getattr(response.raw, "retries", None)
+        history = getattr(retries, "history", None) or ()
+        rate_limited = response.status_code == 429 or any(entry.status == 429 for entry in history)
+
+        with self._lock:
+            previous = self._rate
+            if rate_limited:
+                # Multiplicative decrease as soon as Uber pushes back
+                self._rate = max(self._min_rate, self._rate / 2)
+            else:
+                # Additive increase back towards the configured rate
+                self._rate = min(self._max_rate, self._rate + 0.25)
+
+        if rate_limited and self._rate < previous:
+            log(f"Rate limited by Uber, slowing down to {self._rate:.1f} requests/second", "WARNING")
+
+UBER_RATE_LIMITER = RateLimiter(UBER_REQUESTS_PER_SECOND, burst=MAX_TRIP_WORKERS)
+
+# APQ state shared by the worker threads: hashes the server has accepted, and whether APQ works at all
+_persisted_query_lock = threading.Lock()
+_persisted_query_state = {"enabled": GRAPHQL_PERSISTED_QUERIES, "registered": set()}
+
+@lru_cache(maxsize=None)
+def _persisted_query_hash(query):
+    """SHA256 of the query text, as expected by the APQ protocol."""
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+def _with_persisted_query(payload):
+    """Add the APQ extension to a payload, dropping the query text once its hash is registered."""
+    if not _persisted_query_state["enabled"] or "query" not in payload:
+        return payload
+
+    query_hash = _persisted_query_hash(payload["query"])
+    apq_payload = dict(payload)
+    apq_payload["extensions"] = {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}
+    with _persisted_query_lock:
+        if query_hash in _persisted_query_state["registered"]:
+            del apq_payload["query"]
+    return apq_payload
+
+def _persisted_query_error(response):
+    """
+    Return the APQ error code in a GraphQL response, or None.
+
+    Only the explicit APQ errors count ("PersistedQueryNotFound" / "PersistedQueryNotSupported",
+    as message or as the PERSISTED_QUERY_* extension code); other errors are not about the hash.
+    """
+    if b"PersistedQuery" not in response.content and b"PERSISTED_QUERY" not in response.content:
+        return None
+    try:
+        body = decode_json(response.content)
+    except ValueError:
+        return None
+
+    for result in body if isinstance(body, list) else [body]:
+        if not isinstance(result, dict):
+            continue
+        for error in result.get("errors") or []:
+            code = (error.get("extensions") or {}).get("code")
+            message = error.get("message")
+            if "PersistedQueryNotFound" in (message, code) or code == "PERSISTED_QUERY_NOT_FOUND":
+                return "PersistedQueryNotFound"
+            if "PersistedQueryNotSupported" in (message, code) or code == "PERSISTED_QUERY_NOT_SUPPORTED":
+                return "PersistedQueryNotSupported"
+    return None
+
+def post_graphql(payload, url, headers, timeout=30):
+    """
+    POST a GraphQL payload (or a list of payloads for array batching) through HTTP_SESSION.
+    Queries already registered with the server are sent as APQ hashes only; if the server
+    rejects a hash the full query text is resent.
+
+    Returns:
+        requests.Response: The final response (request exceptions propagate to the caller)
+    """
+    payloads = payload if isinstance(payload, list) else [payload]
+
+    def send(items):
+        body = items if isinstance(payload, list) else items[0]
+        UBER_RATE_LIMITER.acquire()
+        response = HTTP_SESSION.post(url, headers=headers, data=encode_json(body), timeout=timeout)
+        UBER_RATE_LIMITER.record(response)
+        return response
+
+    sent = [_with_persisted_query(p) for p in payloads]
+    response = send(sent)
+    apq_error = _persisted_query_error(response)
+
+    if apq_error == "PersistedQueryNotSupported":
+        with _persisted_query_lock:
+            if _persisted_query_state["enabled"]:
+                log("Server does not support persisted queries, sending full queries from now on", "INFO")
+            _persisted_query_state["enabled"] = False
+        return send(payloads)
+
+    if any("extensions" in p and "query" not in p for p in sent):
+        if apq_error == "PersistedQueryNotFound":
+            # Server evicted our hashes - resend with the full query text
+            log("Persisted query not found on server, resending full query", "WARNING")
+            with _persisted_query_lock:
+                _persisted_query_state["registered"].clear()
+            sent = [_with_persisted_query(p) for p in payloads]
+            response = send(sent)
+        elif response.status_code != 200 or b'"errors"' in response.content:
+            # Not an APQ error (rate limit, server error or a normal GraphQL error):
+            # retry this call with the full query text
+            sent = [dict(p, query=original["query"]) if "extensions" in p else p
+                    for p, original in zip(sent, payloads)]
+            response = send(sent)
+            if response.status_code == 200 and b'"errors"' not in response.content:
+                # The full query worked where the hash did not, so the server ignores
+                # the extension - stop paying two requests per call for the rest of the run
+                with _persisted_query_lock:
+                    if _persisted_query_state["enabled"]:
+                        log("Server did not accept persisted query hashes, sending full queries from now on", "INFO")
+                    _persisted_query_state["enabled"] = False
+                    _persisted_query_state["registered"].clear()
+                return response
+
+    if not _persisted_query_state["enabled"] or response.status_code != 200:
+        return response
+
+    # Full query text was accepted - later calls can send only the hash
+    with _persisted_query_lock:
+        for p in sent:
+            if "query" in p and "extensions" in p:
+                _persisted_query_state["registered"].add(p["extensions"]["persistedQuery"]["sha256Hash"])
+    return response
+
 def get_uber_trips(cookie, start_time_ms, end_time_ms, config=None, download_receipts=True, debug_limit=None):
     """
     Fetch Uber trips from GraphQL API for the specified time range.
@@ -347,303 +909,561 @@ def get_uber_trips(cookie, start_time_ms, end_time_ms, config=None, download_rec
     log("Fetching trips from Uber API...", "INFO")
     
     url = UBER_GRAPHQL_URL
-    headers = {
-        "cookie": cookie,
-        "content-type": "application/json",
-        "Cache-Control": "no-cache",
-        "User-Agent": "PostmanRuntime/7.45.0",
-        "origin": "https://riders.uber.com",
-        "x-csrf-token": "x",
-    }
-
-    # 1. Query to list trips
-    activities_query = """
-query Activities(
-  $cityID: Int
-  $endTimeMs: Float
-  $includePast: Boolean = true
-  $includeUpcoming: Boolean = true
-  $limit: Int = 60
-  $nextPageToken: String
-  $orderTypes: [RVWebCommonActivityOrderType!] = [RIDES, TRAVEL]
-  $profileType: RVWebCommonActivityProfileType = PERSONAL
-  $startTimeMs: Float
-) {
-  activities(cityID: $cityID) {
-    past(
-      endTimeMs: $endTimeMs
-      limit: $limit
-      nextPageToken: $nextPageToken
-      orderTypes: $orderTypes
-      profileType: $profileType
-      startTimeMs: $startTimeMs
-    ) @include(if: $includePast) {
-      activities {
-        uuid
-        cardURL
-        description
-        subtitle  
-        __typename
-      }
-      nextPageToken
-      __typename
-    }
-    upcoming @include(if: $includeUpcoming) {
-      activities {
-        uuid
-        cardURL
-        description
-        subtitle
-        __typename
-      }
-      __typename
-    }
-    __typename
-  }
-}
-"""
+    # Static headers are session defaults (see create_http_session); only the cookie is per call
+    headers = {"cookie": cookie}
 
-    # 2. Query to get details of a single trip (pickup & dropoff)
-    trip_details_query = """
-query GetTrip($tripUUID: String!) {
-  getTrip(tripUUID: $tripUUID) {
-    trip {
-      uuid
-      waypoints
-    }
-  }
-}
-"""
+    # Cached responses belong to this cookie's account
+    set_graphql_cache_scope(cookie)
 
-    # 3. Receipt query
-    receipt_query = """
-query GetReceipt($tripUUID: String!, $timestamp: String) {
-  getReceipt(tripUUID: $tripUUID, timestamp: $timestamp) {
-    receiptsForJob {
-      timestamp
-      type
-    }
-    receiptData
-  }
-}
-"""
+    # Check the cookie with one small request before any trip workers are started
+    if not validate_auth(url, headers, start_time_ms, end_time_ms):
+        return [], 0.0
 
-    # Fetch all trips with pagination
+    # Fetch the trip list page by page. Each page is handed to the trip workers as soon as
+    # it arrives, so its trips are processed while the next page is still downloading.
     log("Making API request to fetch trip list...", "INFO")
-    all_activities = []
-    next_page_token = None
-    page_count = 0
-    
+    trips = []
+    overall_amount = 0.0
+    futures = []
+    total_fetched = 0
+
+    log(f"Processing trips with {MAX_TRIP_WORKERS} concurrent workers", "INFO")
+    with ThreadPoolExecutor(max_workers=MAX_TRIP_WORKERS) as executor:
+        for page_activities in iter_activity_pages(url, headers, start_time_ms, end_time_ms):
+            if page_activities is None:
+                # The trip list is incomplete - don't produce a partial report
+                for future in futures:
+                    future.cancel()
+                return [], 0.0
+
+            total_fetched += len(page_activities)
+
+            # Debug limit for testing
+            if debug_limit:
+                page_activities = page_activities[:max(debug_limit - len(futures), 0)]
+
+            # Prefetch trip details and receipt timestamps with batched requests
+            prefetched = prefetch_trip_data([trip["uuid"] for trip in page_activities], url, headers)
+
+            futures.extend(
+                executor.submit(process_trip, trip, url, headers, config, download_receipts,
+                                prefetched.get(trip["uuid"]))
+                for trip in page_activities
+            )
+
+            if debug_limit and len(futures) >= debug_limit:
+                break
+
+        log(f"Total trips fetched: {total_fetched}", "SUCCESS")
+
+        for completed, _ in enumerate(as_completed(futures), start=1):
+            log_progress(completed, len(futures), "Processing trips")
+
+    # Collect results in the original activity order
+    for future in futures:
+        price, trip_data = future.result()
+        overall_amount += price
+        if trip_data:
+            trips.append(trip_data)
+
+    log(f"Successfully processed {len(trips)} trips", "SUCCESS")
+    log(f"Total amount: ${overall_amount:.2f}", "INFO")
+    
+    return trips, overall_amount
+
+def validate_auth(url, headers, start_time_ms, end_time_ms):
+    """
+    Preflight the auth cookie with a single one-trip Activities request (never cached),
+    so a stale cookie fails once with a clear message instead of in every trip worker.
+
+    Returns:
+        bool: True if Uber accepted the cookie
+    """
+    log("Validating authentication cookie...", "INFO")
+
+    payload = {
+        "operationName": "Activities",
+        "query": ACTIVITIES_QUERY,
+        "variables": {
+            "endTimeMs": end_time_ms,
+            "startTimeMs": start_time_ms,
+            "limit": 1,
+        },
+    }
+
+    try:
+        response = post_graphql(payload, url, headers, timeout=15)
+    except requests.exceptions.RequestException as e:
+        log(f"Could not reach Uber to validate the cookie: {e}", "ERROR")
+        return False
+
+    if response.status_code in (401, 403):
+        log(f"Cookie rejected by Uber (HTTP {response.status_code}) - refresh token.txt and run again", "ERROR")
+        return False
+
+    if response.status_code != 200:
+        log(f"Cookie validation failed: HTTP {response.status_code}", "ERROR")
+        return False
+
+    try:
+        data = decode_json(response.content)
+    except ValueError:
+        log("Cookie validation returned an invalid response - refresh token.txt and run again", "ERROR")
+        return False
+
+    if not isinstance(data, dict) or data.get("errors") or not data.get("data"):
+        log("Cookie expired or invalid - refresh token.txt and run again", "ERROR")
+        return False
+
+    log("Authentication cookie is valid", "SUCCESS")
+    return True
+
+def iter_activity_pages(url, headers, start_time_ms, end_time_ms, max_pages=10):
+    """
+    Fetch the trip list with pagination, yielding one page of activities at a time.
+
+    Args:
+        url (str): GraphQL endpoint URL
+        headers (dict): Request headers including the auth cookie
+        start_time_ms (int): Start timestamp in milliseconds
+        end_time_ms (int): End timestamp in milliseconds
+        max_pages (int): Safety limit to avoid infinite loops
+
+    Yields:
+        list: Activities of the next page, or None if the request failed
+    """
+    total_activities = 0
+    next_page_token = None
+    page_count = 0
+
     while True:
         page_count += 1
         log(f"Fetching page {page_count} of trips...", "INFO")
-        
+
         # Variables for the activities query
         variables = {
             "endTimeMs": end_time_ms,
             "startTimeMs": start_time_ms,
             "limit": 200,  # Increased limit for fewer API calls
             "includePast": True,
-            "includeUpcoming": False,
             "orderTypes": ["RIDES", "TRAVEL"],
             "profileType": "PERSONAL"
         }
-        
+
         # Add pagination token if available
         if next_page_token:
             variables["nextPageToken"] = next_page_token
 
         payload = {
             "operationName": "Activities",
-            "query": activities_query,
+            "query": ACTIVITIES_QUERY,
             "variables": variables,
         }
 
-        try:
-            response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=30)
-        except requests.exceptions.Timeout:
-            log("Timeout while fetching trips from API", "ERROR")
-            return [], 0.0
-        except requests.exceptions.RequestException as e:
-            log(f"Network error while fetching trips: {e}", "ERROR")
-            return [], 0.0
-
-        if response.status_code != 200:
-            log(f"Failed to fetch trips: HTTP {response.status_code}", "ERROR")
-            return [], 0.0
+        data = get_cached_response("Activities", variables)
+        if data is not None:
+            log(f"Using cached trip list for page {page_count}", "INFO")
+        else:
+            try:
+                response = post_graphql(payload, url, headers, timeout=30)
+            except requests.exceptions.Timeout:
+                log("Timeout while fetching trips from API", "ERROR")
+                yield None
+                return
+            except requests.exceptions.RequestException as e:
+                log(f"Network error while fetching trips: {e}", "ERROR")
+                yield None
+                return
+
+            if response.status_code != 200:
+                log(f"Failed to fetch trips: HTTP {response.status_code}", "ERROR")
+                if response.status_code in (401, 403):
+                    log("Authentication failed - update token.txt with a fresh cookie and run again", "ERROR")
+                yield None
+                return
+
+            data = decode_json(response.content)
+            store_cached_response("Activities", variables, data)
 
-        data = response.json()
-        
         if not data or "data" not in data or not data["data"]:
             log("No data returned from API", "ERROR")
-            break
-            
+            return
+
         past_data = data["data"].get("activities", {}).get("past", {})
         page_activities = past_data.get("activities", [])
         next_page_token = past_data.get("nextPageToken")
-        
+
         if not page_activities:
             log("No more trips found", "INFO")
-            break
-            
-        all_activities.extend(page_activities)
-        log(f"Found {len(page_activities)} trips on page {page_count} (total: {len(all_activities)})", "INFO")
-        
+            return
+
+        total_activities += len(page_activities)
+        log(f"Found {len(page_activities)} trips on page {page_count} (total: {total_activities})", "INFO")
+        yield page_activities
+
         # Break if no more pages
         if not next_page_token:
             log("No more pages available", "INFO")
-            break
-            
-        # Add delay between API calls to avoid rate limiting
-        time.sleep(1)
-        
+            return
+
+        # No fixed delay: the next page request waits on UBER_RATE_LIMITER inside post_graphql()
+
         # Safety limit to avoid infinite loops
-        if page_count >= 10:
-            log("Reached maximum page limit (10), stopping pagination", "WARNING")
-            break
-    
-    activities_data = all_activities
-    log(f"Total trips fetched: {len(activities_data)}", "SUCCESS")
+        if page_count >= max_pages:
+            log(f"Reached maximum page limit ({max_pages}), stopping pagination", "WARNING")
+            return
 
-    trips = []
-    overall_amount = 0.0
+def process_trip(trip, url, headers, config=None, download_receipts=True, prefetched=None):
+    """
+    Fetch details and receipt for a single trip and build its record.
+    Runs inside a worker thread of get_uber_trips().
 
-    for i, trip in enumerate(activities_data):
-        log_progress(i + 1, len(activities_data), "Processing trips")
-        
-        # Debug limit for testing
-        if debug_limit and i >= debug_limit:
-            break
-            
-        uuid = trip["uuid"]
-        trip_url = trip["cardURL"]
-        desc = trip.get("description", "")   
-        subtitle = trip.get("subtitle", "")  
-
-        # Parse price from description
-        match = re.search(r"([0-9]+(?:\.[0-9]+)?)", desc)
-        price = float(match.group(1)) if match else 0.0
-        overall_amount += price
+    Args:
+        trip (dict): Activity entry from the Activities query
+        url (str): GraphQL endpoint URL
+        headers (dict): Request headers including the auth cookie
+        config (dict): Configuration for fare breakdown and address keywords
+        download_receipts (bool): Whether to download the receipt PDF
+        prefetched (dict): Batched 'details'/'receipt' responses for this trip, if any
 
-        # Check if trip was canceled
-        status = "Canceled" if "canceled" in desc.lower() else "Completed"
-        if status == "Canceled" or "unfulfilled" in desc.lower():
-            log(f"Skipping canceled trip: {uuid}", "WARNING")
-            continue
+    Returns:
+        tuple: (price, trip_data) - trip_data is None for skipped trips
+    """
+    config = config or {}
+
+    uuid = trip["uuid"]
+    trip_url = trip["cardURL"]
+    desc = trip.get("description", "")
+    subtitle = trip.get("subtitle", "")
+
+    # Parse price from description
+    match = PRICE_RE.search(desc)
+    price = float(match.group(1)) if match else 0.0
+
+    # Check if trip was canceled
+    status = "Canceled" if "canceled" in desc.lower() else "Completed"
+    if status == "Canceled" or "unfulfilled" in desc.lower():
+        log(f"Skipping canceled trip: {uuid}", "WARNING")
+        return price, None
+
+    # Use batch-prefetched responses when available, otherwise fetch individually
+    prefetched = prefetched or {}
+
+    # Fetch trip details (pickup & dropoff addresses)
+    detail_data = prefetched.get("details")
+    if detail_data is None:
+        detail_data = get_trip_details(uuid, url, headers)
+    pickup_address, dropoff_address = parse_trip_addresses(detail_data, uuid)
+
+    # Check if trip is a valid work commute (home ↔ work only) before any receipt requests,
+    # so non-work trips cost no receipt HTML or PDF downloads
+    home_pattern = compile_keyword_pattern(tuple(config.get('home_address_keywords', [])))
+    work_pattern = compile_keyword_pattern(tuple(config.get('work_address_keywords', [])))
+
+    # Check for home keywords in pickup/dropoff
+    is_pickup_home = bool(home_pattern and home_pattern.search(pickup_address))
+    is_dropoff_home = bool(home_pattern and home_pattern.search(dropoff_address))
+
+    # Check for work keywords in pickup/dropoff
+    is_pickup_work = bool(work_pattern and work_pattern.search(pickup_address))
+    is_dropoff_work = bool(work_pattern and work_pattern.search(dropoff_address))
+
+    # Only include trips that are: (home→work) OR (work→home)
+    is_valid_work_trip = (is_pickup_home and is_dropoff_work) or (is_pickup_work and is_dropoff_home)
+
+    if not is_valid_work_trip:
+        log(f"Skipping non-work trip: {uuid} (not a home↔work commute)", "WARNING")
+        return price, None
+
+    # Get receipt data for fare breakdown and payment method
+    receipt_html = None
+    fare_breakdown = None
+    payment_method = "App Wallet"  # Default
+
+    # Get receipt timestamp and data
+    receipt_data = prefetched.get("receipt")
+    if receipt_data is not None:
+        timestamp = parse_receipt_timestamp(receipt_data, uuid)
+    else:
+        timestamp = get_receipt_timestamp(uuid, headers)
+    if timestamp:
+        # Get receipt HTML for fare breakdown and payment method parsing
+        receipt_html = get_receipt_html(uuid, timestamp, headers)
+        if receipt_html:
+            # Parse fare breakdown from receipt HTML
+            fare_breakdown = parse_fare_breakdown(receipt_html, config, uuid)
+            # Parse payment method from receipt HTML
+            payment_method = parse_payment_method(receipt_html, uuid)
+
+        # Download PDF if enabled
+        if download_receipts:
+            download_receipt_pdf(uuid, timestamp, headers)
+    else:
+        log(f"No receipt timestamp found for trip {uuid}", "WARNING")
+
+    # Prepare trip data with fare breakdown and payment method
+    trip_data = {
+        "uuid": uuid,
+        "url": trip_url,
+        "status": status,
+        "price": price,
+        "time": subtitle,
+        "pickup_location": pickup_address,
+        "dropoff_location": dropoff_address,
+        "payment_method": payment_method,
+    }
 
-        pickup_address = ""
-        dropoff_address = ""
+    # Add fare breakdown data if available
+    if fare_breakdown:
+        trip_data["fare_breakdown"] = fare_breakdown
+        trip_data["subtracted_fees_total"] = fare_breakdown.get("subtracted_fees_total", 0.0)
+        trip_data["original_price"] = price - fare_breakdown.get("subtracted_fees_total", 0.0)
+        trip_data["subtracted_fees"] = fare_breakdown.get("subtracted_fees", [])
+    else:
+        trip_data["subtracted_fees_total"] = 0.0
+        trip_data["original_price"] = price
+        trip_data["subtracted_fees"] = []
 
-        # Fetch trip details (pickup & dropoff addresses)
-        trip_payload = {
-            "operationName": "GetTrip",
-            "query": trip_details_query,
-            "variables": {"tripUUID": uuid},
-        }
+    return price, trip_data
 
-        try:
-            detail_resp = requests.post(url, headers=headers, data=json.dumps(trip_payload), timeout=15)
-        except requests.exceptions.Timeout:
-            log(f"Timeout fetching trip details for {uuid}", "WARNING")
-            detail_resp = None
-        except requests.exceptions.RequestException as e:
-            log(f"Network error fetching trip details for {uuid}: {e}", "WARNING")
-            detail_resp = None
-        
-        if detail_resp and detail_resp.status_code == 200:
-            detail_data = detail_resp.json()
-            if detail_data and "data" in detail_data and detail_data["data"]:
-                trip_info = detail_data["data"].get("getTrip", {})
-                if trip_info and "trip" in trip_info:
-                    trip_data = trip_info["trip"]
-                    waypoints = trip_data.get("waypoints", [])
-                    
-                    if len(waypoints) >= 2:
-                        # Waypoints are directly strings, not objects with 'name' property
-                        pickup_address = waypoints[0] if isinstance(waypoints[0], str) else "Unknown pickup"
-                        dropoff_address = waypoints[-1] if isinstance(waypoints[-1], str) else "Unknown dropoff"
-                    else:
-                        log(f"Insufficient waypoint data for trip {uuid}", "WARNING")
-                else:
-                    log(f"No trip data found for {uuid}", "WARNING")
+@lru_cache(maxsize=None)
+def compile_keyword_pattern(keywords):
+    """
+    Compile address keywords (a tuple) into one case-insensitive regex, built once per keyword list,
+    so each address is scanned once instead of lowercasing every keyword for every trip.
+    Returns None when there are no keywords.
+    """
+    if not keywords:
+        return None
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+
+def get_trip_details(uuid, url, headers):
+    """Fetch the GetTrip response for a single trip. Returns the JSON body or None."""
+    trip_payload = {
+        "operationName": "GetTrip",
+        "query": TRIP_DETAILS_QUERY,
+        "variables": {"tripUUID": uuid},
+    }
+
+    cached = get_cached_response("GetTrip", trip_payload["variables"])
+    if cached is not None:
+        log(f"Using cached trip details for {uuid}", "INFO")
+        return cached
+
+    try:
+        detail_resp = post_graphql(trip_payload, url, headers, timeout=15)
+    except requests.exceptions.Timeout:
+        log(f"Timeout fetching trip details for {uuid}", "WARNING")
+        return None
+    except requests.exceptions.RequestException as e:
+        log(f"Network error fetching trip details for {uuid}: {e}", "WARNING")
+        return None
+
+    if detail_resp.status_code != 200:
+        log(f"Failed to fetch trip details for {uuid}", "WARNING")
+        return None
+
+    detail_data = decode_json(detail_resp.content)
+    store_cached_response("GetTrip", trip_payload["variables"], detail_data)
+    return detail_data
+
+def parse_trip_addresses(detail_data, uuid):
+    """
+    Extract pickup and dropoff addresses from a GetTrip response.
+
+    Returns:
+        tuple: (pickup_address, dropoff_address) - empty strings if unavailable
+    """
+    pickup_address = ""
+    dropoff_address = ""
+
+    if detail_data is None:
+        return pickup_address, dropoff_address
+
+    if detail_data and "data" in detail_data and detail_data["data"]:
+        trip_info = detail_data["data"].get("getTrip", {})
+        if trip_info and "trip" in trip_info:
+            trip_data = trip_info["trip"]
+            waypoints = trip_data.get("waypoints", [])
+
+            if len(waypoints) >= 2:
+                # Waypoints are directly strings, not objects with 'name' property.
+                # The same home/work addresses repeat across trips, so keep a single copy of each.
+                pickup_address = sys.intern(waypoints[0]) if isinstance(waypoints[0], str) else "Unknown pickup"
+                dropoff_address = sys.intern(waypoints[-1]) if isinstance(waypoints[-1], str) else "Unknown dropoff"
             else:
-                log(f"No valid data in response for {uuid}", "WARNING")
+                log(f"Insufficient waypoint data for trip {uuid}", "WARNING")
         else:
-            log(f"Failed to fetch trip details for {uuid}", "WARNING")
+            log(f"No trip data found for {uuid}", "WARNING")
+    else:
+        log(f"No valid data in response for {uuid}", "WARNING")
 
-        # Get receipt data for fare breakdown and payment method
-        receipt_html = None
-        fare_breakdown = None
-        payment_method = "App Wallet"  # Default
-        
-        # Get receipt timestamp and data
-        timestamp = get_receipt_timestamp(uuid, headers)
-        if timestamp:
-            # Get receipt HTML for fare breakdown and payment method parsing
-            receipt_html = get_receipt_html(uuid, timestamp, headers)
-            if receipt_html:
-                # Parse fare breakdown from receipt HTML
-                fare_breakdown = parse_fare_breakdown(receipt_html, config or {}, uuid)
-                # Parse payment method from receipt HTML
-                payment_method = parse_payment_method(receipt_html, uuid)
-            
-            # Download PDF if enabled
-            if download_receipts:
-                download_receipt_pdf(uuid, timestamp, headers)
-        else:
-            log(f"No receipt timestamp found for trip {uuid}", "WARNING")
+    return pickup_address, dropoff_address
 
-        # Check if trip is a valid work commute (home ↔ work only)
-        pickup_lower = pickup_address.lower()
-        dropoff_lower = dropoff_address.lower()
-        
-        # Check for home keywords in pickup/dropoff
-        is_pickup_home = any(keyword.lower() in pickup_lower for keyword in config.get('home_address_keywords', []))
-        is_dropoff_home = any(keyword.lower() in dropoff_lower for keyword in config.get('home_address_keywords', []))
-        
-        # Check for work keywords in pickup/dropoff
-        is_pickup_work = any(keyword.lower() in pickup_lower for keyword in config.get('work_address_keywords', []))
-        is_dropoff_work = any(keyword.lower() in dropoff_lower for keyword in config.get('work_address_keywords', []))
-        
-        # Only include trips that are: (home→work) OR (work→home)
-        is_valid_work_trip = (is_pickup_home and is_dropoff_work) or (is_pickup_work and is_dropoff_home)
-        
-        if not is_valid_work_trip:
-            log(f"Skipping non-work trip: {uuid} (not a home↔work commute)", "WARNING")
-            continue
-        
-        # Prepare trip data with fare breakdown and payment method
-        trip_data = {
-            "uuid": uuid,
-            "url": trip_url,
-            "status": status,
-            "price": price,
-            "time": subtitle,
-            "pickup_location": pickup_address,
-            "dropoff_location": dropoff_address,
-            "payment_method": payment_method,
-        }
-        
-        # Add fare breakdown data if available
-        if fare_breakdown:
-            trip_data["fare_breakdown"] = fare_breakdown
-            trip_data["subtracted_fees_total"] = fare_breakdown.get("subtracted_fees_total", 0.0)
-            trip_data["original_price"] = price - fare_breakdown.get("subtracted_fees_total", 0.0)
-            trip_data["subtracted_fees"] = fare_breakdown.get("subtracted_fees", [])
-        else:
-            trip_data["subtracted_fees_total"] = 0.0
-            trip_data["original_price"] = price
-            trip_data["subtracted_fees"] = []
+def post_graphql_batch(operations, url, headers, timeout=30):
+    """
+    Send several GraphQL operations in one HTTP request (array batching).
 
-        trips.append(trip_data)
-        
-        # Add delay between API calls to avoid rate limiting
-        time.sleep(0.5)
+    Args:
+        operations (list): GraphQL payload dicts
+        url (str): GraphQL endpoint URL
+        headers (dict): Request headers including the auth cookie
+        timeout (int): Request timeout in seconds
 
-    log(f"Successfully processed {len(trips)} trips", "SUCCESS")
-    log(f"Total amount: ${overall_amount:.2f}", "INFO")
-    
-    return trips, overall_amount
+    Returns:
+        list: Responses aligned with the input order, or None if batching failed
+    """
+    try:
+        response = post_graphql(operations, url, headers, timeout=timeout)
+    except requests.exceptions.Timeout:
+        log(f"Timeout sending batch of {len(operations)} GraphQL operations", "WARNING")
+        return None
+    except requests.exceptions.RequestException as e:
+        log(f"Network error sending GraphQL batch: {e}", "WARNING")
+        return None
+
+    if response.status_code != 200:
+        log(f"GraphQL batch request failed: HTTP {response.status_code}", "WARNING")
+        return None
+
+    try:
+        results = decode_json(response.content)
+    except ValueError:
+        log("GraphQL batch response is not valid JSON", "WARNING")
+        return None
+
+    if not isinstance(results, list) or len(results) != len(operations):
+        log("GraphQL endpoint did not return a batched response", "WARNING")
+        return None
+
+    return results
+
+def build_aliased_query(operations):
+    """
+    Combine GetTrip/GetReceipt operations into a single GraphQL query, one alias (a0, a1, ...)
+    per operation. Unlike array batching this is plain GraphQL, so any server accepts it.
+    """
+    declarations = []
+    fields = []
+    variables = {}
+    for index, operation in enumerate(operations):
+        field, selection = ALIASED_OPERATIONS[operation["operationName"]]
+        arguments = []
+        for name, value in operation["variables"].items():
+            variable = f"{name}{index}"
+            declarations.append(f"${variable}: {ALIASED_VARIABLE_TYPES[name]}")
+            arguments.append(f"{name}: ${variable}")
+            variables[variable] = value
+        fields.append(f"  a{index}: {field}({', '.join(arguments)}) {selection}")
+
+    query = f"query TripBatch({', '.join(declarations)}) {{\n" + "\n".join(fields) + "\n}"
+    return {"operationName": "TripBatch", "query": query, "variables": variables}
+
+def post_graphql_aliased(operations, url, headers, timeout=30):
+    """
+    Send several GraphQL operations as one aliased query.
+
+    Returns:
+        list: Per-operation responses shaped like a single-operation response ({"data": {field: ...}}),
+              with None for operations the server returned nothing for, or None if the request failed
+    """
+    try:
+        response = post_graphql(build_aliased_query(operations), url, headers, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        log(f"Network error sending aliased GraphQL query: {e}", "WARNING")
+        return None
+
+    if response.status_code != 200:
+        log(f"Aliased GraphQL request failed: HTTP {response.status_code}", "WARNING")
+        return None
+
+    try:
+        data = decode_json(response.content).get("data")
+    except (ValueError, AttributeError):
+        log("Aliased GraphQL response is not valid JSON", "WARNING")
+        return None
+
+    if not data:
+        log("Aliased GraphQL query returned no data", "WARNING")
+        return None
+
+    results = []
+    for index, operation in enumerate(operations):
+        field, _ = ALIASED_OPERATIONS[operation["operationName"]]
+        value = data.get(f"a{index}")
+        results.append({"data": {field: value}} if value is not None else None)
+    return results
+
+def prefetch_trip_data(uuids, url, headers):
+    """
+    Fetch GetTrip and GetReceipt responses for many trips using batched requests.
+
+    Args:
+        uuids (list): Trip UUIDs to prefetch
+        url (str): GraphQL endpoint URL
+        headers (dict): Request headers including the auth cookie
+
+    Returns:
+        dict: {uuid: {'details': ..., 'receipt': ...}} - trips missing from the
+              result fall back to individual requests in process_trip()
+    """
+    prefetched = {}
+    pending = []  # (uuid, key, operation) still to be fetched
+    cached_count = 0
+
+    for uuid in uuids:
+        operations = {
+            "details": {
+                "operationName": "GetTrip",
+                "query": TRIP_DETAILS_QUERY,
+                "variables": {"tripUUID": uuid},
+            },
+            "receipt": {
+                "operationName": "GetReceipt",
+                "query": RECEIPT_TIMESTAMP_QUERY,
+                "variables": {"tripUUID": uuid, "timestamp": ""},
+            },
+        }
+        prefetched[uuid] = {}
+        for key, operation in operations.items():
+            cached = get_cached_response(operation["operationName"], operation["variables"])
+            if cached is not None:
+                prefetched[uuid][key] = cached
+                cached_count += 1
+            else:
+                pending.append((uuid, key, operation))
+
+    if cached_count:
+        log(f"Using {cached_count} cached trip responses", "INFO")
+
+    # Each trip contributes two operations to a batch
+    batch_ops = GRAPHQL_BATCH_SIZE * 2
+    use_array_batching = True
+    for start in range(0, len(pending), batch_ops):
+        group = pending[start:start + batch_ops]
+        operations = [operation for _, _, operation in group]
+        log(f"Fetching {len(group)} trip operations in one batched request", "INFO")
+
+        results = None
+        if use_array_batching:
+            results = post_graphql_batch(operations, url, headers)
+            if results is None:
+                log("Array batching not available, combining operations into aliased queries", "WARNING")
+                use_array_batching = False
+        if results is None:
+            results = post_graphql_aliased(operations, url, headers)
+        if results is None:
+            log("Batching not available, falling back to per-trip requests", "WARNING")
+            return prefetched
+
+        for (uuid, key, operation), result in zip(group, results):
+            if result is None:
+                continue  # Fetched individually by process_trip()
+            prefetched[uuid][key] = result
+            store_cached_response(operation["operationName"], operation["variables"], result)
+
+    log(f"Prefetched details for {len(prefetched)} trips", "SUCCESS")
+    return prefetched
 
 def parse_fare_breakdown(receipt_html, config, uuid):
     """
@@ -773,6 +1593,24 @@ def download_receipt_pdf(uuid, timestamp, headers, folder="receipts", max_retrie
     """Download receipt PDF for a specific trip with retry logic."""
     os.makedirs(folder, exist_ok=True)
     pdf_path = os.path.join(folder, f"{uuid}.pdf")
+    part_path = pdf_path + ".part"
+
+    # Reuse a receipt already downloaded by a previous (interrupted) run, without any request
+    if is_pdf_file(pdf_path):
+        log(f"Receipt already downloaded: {pdf_path}", "INFO")
+        return pdf_path
+
+    # Reuse a receipt kept from an earlier run
+    cached_path = get_receipt_cache_path(uuid)
+    if is_pdf_file(cached_path):
+        try:
+            link_or_copy(cached_path, part_path)
+            os.replace(part_path, pdf_path)
+            os.utime(cached_path)  # Mark as recently used for prune_receipt_cache()
+            log(f"Using cached receipt for trip {uuid}", "INFO")
+            return pdf_path
+        except OSError as e:
+            log(f"Could not reuse cached receipt for {uuid}: {e}", "WARNING")
 
     url = f"https://riders.uber.com/trips/{uuid}/receipt?contentType=PDF&timestamp={timestamp}"
 
@@ -780,18 +1618,24 @@ def download_receipt_pdf(uuid, timestamp, headers, folder="receipts", max_retrie
     
     for attempt in range(max_retries):
         try:
-            resp = requests.get(url, headers=headers, timeout=timeout)
-            if resp.status_code == 200 and resp.headers.get("content-type", "").startswith("application/pdf"):
-                with open(pdf_path, "wb") as f:
-                    f.write(resp.content)
-                log(f"Successfully saved receipt: {pdf_path}", "SUCCESS")
-                return pdf_path
-            else:
-                log(f"Failed to download receipt for {uuid}: HTTP {resp.status_code}", "WARNING")
-                if attempt < max_retries - 1:
-                    log(f"Retrying download for {uuid} (attempt {attempt + 2}/{max_retries})", "INFO")
-                    time.sleep(2)  # Wait before retry
-                continue
+            UBER_RATE_LIMITER.acquire()
+            with HTTP_SESSION.get(url, headers=headers, timeout=timeout, stream=True) as resp:
+                UBER_RATE_LIMITER.record(resp)
+                if resp.status_code == 200 and resp.headers.get("content-type", "").startswith("application/pdf"):
+                    # Stream to a temporary file so an interrupted download is never mistaken for a receipt
+                    with open(part_path, "wb") as f:
+                        for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                    os.replace(part_path, pdf_path)
+                    log(f"Successfully saved receipt: {pdf_path}", "SUCCESS")
+                    store_receipt_in_cache(pdf_path, cached_path)
+                    return pdf_path
+                else:
+                    log(f"Failed to download receipt for {uuid}: HTTP {resp.status_code}", "WARNING")
+                    if attempt < max_retries - 1:
+                        log(f"Retrying download for {uuid} (attempt {attempt + 2}/{max_retries})", "INFO")
+                        time.sleep(2)  # Wait before retry
+                    continue
         except requests.exceptions.Timeout:
             log(f"Timeout downloading receipt for {uuid} (attempt {attempt + 1}/{max_retries})", "WARNING")
             if attempt < max_retries - 1:
@@ -804,9 +1648,62 @@ def download_receipt_pdf(uuid, timestamp, headers, folder="receipts", max_retrie
             log(f"Unexpected error downloading receipt for {uuid}: {e}", "ERROR")
             break
     
+    if os.path.exists(part_path):
+        os.remove(part_path)
+
     log(f"Failed to download receipt for {uuid} after {max_retries} attempts", "ERROR")
     return None
 
+def is_pdf_file(path):
+    """Check that path exists and starts with the PDF header, so a bad leftover file is downloaded again."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(5) == b"%PDF-"
+    except OSError:
+        return False
+
+def get_receipt_cache_path(uuid):
+    """Path of a trip's receipt in the cache kept between runs."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, RECEIPT_CACHE_DIR, f"{uuid}.pdf")
+
+def link_or_copy(source, destination):
+    """Hard-link source to destination (no data copied), or copy it across filesystems."""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+def store_receipt_in_cache(pdf_path, cached_path):
+    """Keep a downloaded receipt for later runs; failures only cost a re-download."""
+    part_path = cached_path + ".part"
+    try:
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        link_or_copy(pdf_path, part_path)
+        os.replace(part_path, cached_path)
+    except OSError as e:
+        log(f"Could not cache receipt {pdf_path}: {e}", "WARNING")
+
+def prune_receipt_cache():
+    """Delete the least recently used cached receipts beyond RECEIPT_CACHE_MAX_FILES."""
+    cache_dir = os.path.dirname(get_receipt_cache_path("x"))
+    if not os.path.isdir(cache_dir):
+        return
+
+    entries = [entry for entry in os.scandir(cache_dir) if entry.is_file() and entry.name.endswith(".pdf")]
+    if len(entries) <= RECEIPT_CACHE_MAX_FILES:
+        return
+
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in entries[RECEIPT_CACHE_MAX_FILES:]:
+        try:
+            os.remove(entry.path)
+        except OSError as e:
+            log(f"Could not remove cached receipt {entry.name}: {e}", "WARNING")
+    log(f"Pruned {len(entries) - RECEIPT_CACHE_MAX_FILES} old receipts from {RECEIPT_CACHE_DIR}", "INFO")
+
 def cleanup_temp_receipts_folder(folder="receipts"):
     """Remove the temporary receipts folder after processing."""
     if os.path.exists(folder):
@@ -816,13 +1713,13 @@ def cleanup_temp_receipts_folder(folder="receipts"):
         log(f"Temporary folder {folder} not found, skipping cleanup", "INFO")
         print(f"🗑️ Cleaned up temporary folder: {folder}")
 
-def create_monthly_excel_copy(template_file, month_year=None, output_folder=None):
+def get_monthly_excel_path(template_file, month_year=None, output_folder=None):
     """
-    Create a copy of the Excel template with month-year prefix in the specified output folder.
+    Build the path of the monthly claim form: the template name with a month-year prefix.
     If month_year is None, it will use the current month-year.
-    If output_folder is None, it will create the file in the current directory.
+    If output_folder is None, the path is in the current directory.
+    The file itself is written by process_excel_file(), straight from the template.
     """
-    log(f"Creating monthly Excel copy from template: {template_file}", "INFO")
     
     if month_year is None:
         month_year = datetime.now().strftime("%Y-%m")
@@ -839,61 +1736,53 @@ def create_monthly_excel_copy(template_file, month_year=None, output_folder=None
     else:
         new_filepath = new_filename
     
-    # Copy the template to new file
-    shutil.copy2(template_file, new_filepath)
-    log(f"Created monthly copy: {new_filepath}", "SUCCESS")
-    
     return new_filepath
 
 def process_excel_file(excel_file, trips, template_excel_file, home_keywords, work_keywords):
-    """Process the Excel file with trip data."""
+    """Fill the template with trip data and save it as excel_file (the template is only read)."""
     log(f"Processing Excel file: {excel_file}", "INFO")
     log(f"Processing {len(trips)} trips", "INFO")
     
-    def classify_trip_reason(pickup_location, home_keywords, work_keywords):
+    # Home keywords are checked before work keywords, matching the classification order
+    reason_patterns = [
+        (compile_keyword_pattern(tuple(home_keywords)), "العودة من العمل"),  # Return from work
+        (compile_keyword_pattern(tuple(work_keywords)), "الذهاب إلى العمل"),  # Going to work
+    ]
+    # The same few pickup addresses repeat all month, so each is classified only once
+    reasons_by_pickup = {}
+
+    def classify_trip_reason(pickup_location):
         """Classify trip reason based on pickup location keywords."""
-        pickup_lower = pickup_location.lower()
-        
-        # Check if any home keyword is in the pickup location
-        for keyword in home_keywords:
-            if keyword.lower() in pickup_lower:
-                return "العودة من العمل"  # Return from work
-        
-        # Check if any work keyword is in the pickup location  
-        for keyword in work_keywords:
-            if keyword.lower() in pickup_lower:
-                return "الذهاب إلى العمل"  # Going to work
-                
-        return ""  # Unknown reason
-    
-    # Open the workbook (use the monthly copy we created)
-    wb = load_workbook(excel_file)
+        reason = reasons_by_pickup.get(pickup_location)
+        if reason is None:
+            reason = next(
+                (label for pattern, label in reason_patterns if pattern and pattern.search(pickup_location)),
+                ""  # Unknown reason
+            )
+            reasons_by_pickup[pickup_location] = reason
+        return reason
+    
+    # Parse the template once and save the filled workbook under the monthly name,
+    # instead of copying the template to disk and parsing the copy
+    log(f"Loading Excel template: {template_excel_file}", "INFO")
+    wb = load_workbook(template_excel_file)
+    if "Claim Form" not in wb.sheetnames:
+        log(f"Template {template_excel_file} has no 'Claim Form' sheet (found: {', '.join(wb.sheetnames)})", "ERROR")
+        raise ValueError("Excel template is missing the 'Claim Form' sheet")
     ws = wb["Claim Form"]
 
     start_row = 8  # Row 8 in Excel (since Excel rows are 1-based)
 
+    # Build all row values first, then write them in one pass
+    rows = []
     for i, trip in enumerate(trips, start=0):
         log_progress(i + 1, len(trips), "Processing Excel rows")
         
-        # Try to parse the trip date
-        try:
-            # Primary format: "Aug 31 • 4:29 PM"
-            date_clean = trip["time"].replace("•", "").strip()
-            trip_dt = datetime.strptime(date_clean, "%b %d %I:%M %p")
-            trip_dt = trip_dt.replace(year=datetime.now().year)
-            trip_date = trip_dt
-        except:
-            try:
-                # Alternative format: "Aug 31, 2025, 4:29 PM"
-                trip_dt = datetime.strptime(
-                    trip["time"].replace("•", "").strip(), "%b %d, %Y, %I:%M %p"
-                )
-                trip_date = trip_dt
-            except:
-                trip_date = trip["time"]  # fallback if parsing fails
+        # Try to parse the trip date (fallback to the raw string if parsing fails)
+        trip_date = parse_subtitle_datetime(trip["time"]) or trip["time"]
 
         # Classify trip reason for Excel column
-        trip_reason_excel = classify_trip_reason(trip["pickup_location"], home_keywords, work_keywords)
+        trip_reason_excel = classify_trip_reason(trip["pickup_location"])
 
         # Use original price if fare breakdown is available, otherwise use total price
         trip_price = trip.get("original_price", trip["price"])
@@ -909,19 +1798,27 @@ def process_excel_file(excel_file, trips, template_excel_file, home_keywords, wo
             fee_reason = ', '.join(fee_descriptions)
             fare_notes = f"Total {total_price:.2f} / Subtracted ({subtracted_amount:.2f}) {fee_reason}"
 
-        row = start_row + i
-        ws.cell(row=row, column=2, value=trip_date)  # Column B = Date
-        ws.cell(row=row, column=3, value=trip["pickup_location"])
-        ws.cell(row=row, column=4, value=trip["dropoff_location"])
-        ws.cell(row=row, column=5, value=trip_price)  # Use original price (excluding fees)
-        ws.cell(row=row, column=6, value=trip_reason_excel)
-        ws.cell(row=row, column=7, value=trip.get("payment_method", "App Wallet"))  # Use actual payment method
-        ws.cell(row=row, column=8, value=fare_notes)  # Add fare notes
-
-        # Format the date column as dd/mm/yyyy
-        ws.cell(row=row, column=2).number_format = "dd/mm/yyyy"
-
-    # Save changes to the monthly copy
+        rows.append((
+            trip_date,  # Column B = Date
+            trip["pickup_location"],
+            trip["dropoff_location"],
+            trip_price,  # Use original price (excluding fees)
+            trip_reason_excel,
+            trip.get("payment_method", "App Wallet"),  # Use actual payment method
+            fare_notes,  # Add fare notes
+        ))
+
+    # Write the rows into the template's block (columns B-H) in one pass; the template's
+    # layout below the rows rules out write-only mode and ws.append()
+    if rows:
+        target_rows = ws.iter_rows(min_row=start_row, max_row=start_row + len(rows) - 1, min_col=2, max_col=8)
+        for cells, row_values in zip(target_rows, rows):
+            for cell, value in zip(cells, row_values):
+                cell.value = value
+            # Format the date column as dd/mm/yyyy
+            cells[0].number_format = "dd/mm/yyyy"
+
+    # Save as the monthly copy
     wb.save(excel_file)
     log(f"Data written to monthly copy: {excel_file}", "SUCCESS")
     log(f"Original template preserved: {template_excel_file}", "INFO")
@@ -930,27 +1827,20 @@ def get_receipt_timestamp(uuid, headers):
     """Get the timestamp for a trip receipt."""
     url = UBER_GRAPHQL_URL
     
-    receipt_query = """
-query GetReceipt($tripUUID: String!, $timestamp: String) {
-  getReceipt(tripUUID: $tripUUID, timestamp: $timestamp) {
-    receiptsForJob {
-      timestamp
-      type
-    }
-    receiptData
-  }
-}
-"""
-    
     receipt_payload = {
         "operationName": "GetReceipt",
-        "query": receipt_query,
+        "query": RECEIPT_TIMESTAMP_QUERY,
         "variables": {"tripUUID": uuid, "timestamp": ""},
     }
     
+    cached = get_cached_response("GetReceipt", receipt_payload["variables"])
+    if cached is not None:
+        log(f"Using cached receipt timestamp for trip {uuid}", "INFO")
+        return parse_receipt_timestamp(cached, uuid)
+
     log(f"Getting receipt timestamp for trip {uuid}", "INFO")
     try:
-        receipt_resp = requests.post(url, headers=headers, data=json.dumps(receipt_payload), timeout=15)
+        receipt_resp = post_graphql(receipt_payload, url, headers, timeout=15)
     except requests.exceptions.Timeout:
         log(f"Timeout getting receipt timestamp for {uuid}", "WARNING")
         return None
@@ -959,81 +1849,76 @@ query GetReceipt($tripUUID: String!, $timestamp: String) {
         return None
         
     if receipt_resp.status_code == 200:
-        receipt_data = receipt_resp.json()
+        receipt_data = decode_json(receipt_resp.content)
+        store_cached_response("GetReceipt", receipt_payload["variables"], receipt_data)
+        return parse_receipt_timestamp(receipt_data, uuid)
 
-        # Defensive checks
-        if not receipt_data or "data" not in receipt_data or not receipt_data["data"]:
-            log(f"No data returned for receipt {uuid}", "WARNING")
-            return None
+    log(f"Request failed for {uuid}: {receipt_resp.status_code}", "ERROR")
+    return None
 
-        receipt_info = receipt_data["data"].get("getReceipt")
-        if receipt_info:
-            jobs = receipt_info.get("receiptsForJob", [])
-            if jobs:
-                log(f"Successfully retrieved timestamp for trip {uuid}", "SUCCESS")
-                return jobs[0]["timestamp"]
-    else:
-        log(f"Request failed for {uuid}: {receipt_resp.status_code}", "ERROR")
+def parse_receipt_timestamp(receipt_data, uuid):
+    """Extract the receipt timestamp from a GetReceipt response."""
+    # Defensive checks
+    if not receipt_data or "data" not in receipt_data or not receipt_data["data"]:
+        log(f"No data returned for receipt {uuid}", "WARNING")
+        return None
+
+    receipt_info = receipt_data["data"].get("getReceipt")
+    if receipt_info:
+        jobs = receipt_info.get("receiptsForJob", [])
+        if jobs:
+            log(f"Successfully retrieved timestamp for trip {uuid}", "SUCCESS")
+            return jobs[0]["timestamp"]
     return None
 
 def get_receipt_html(uuid, timestamp, headers):
     """Get the receipt HTML data for fare breakdown parsing."""
     url = UBER_GRAPHQL_URL
     
-    receipt_query = """
-query GetReceipt($tripUUID: String!, $timestamp: String) {
-  getReceipt(tripUUID: $tripUUID, timestamp: $timestamp) {
-    receiptsForJob {
-      timestamp
-      type
-    }
-    receiptData
-  }
-}
-"""
-    
     receipt_payload = {
         "operationName": "GetReceipt",
-        "query": receipt_query,
+        "query": RECEIPT_QUERY,
         "variables": {"tripUUID": uuid, "timestamp": timestamp},
     }
-    
-    try:
-        receipt_resp = requests.post(url, headers=headers, data=json.dumps(receipt_payload), timeout=15)
-    except requests.exceptions.Timeout:
-        log(f"Timeout getting receipt HTML for {uuid}", "WARNING")
-        return None
-    except requests.exceptions.RequestException as e:
-        log(f"Network error getting receipt HTML for {uuid}: {e}", "WARNING")
-        return None
-        
-    if receipt_resp.status_code == 200:
-        receipt_data = receipt_resp.json()
 
-        # Defensive checks
-        if not receipt_data or "data" not in receipt_data or not receipt_data["data"]:
-            log(f"No receipt data returned for {uuid}", "WARNING")
+    receipt_data = get_cached_response("GetReceipt", receipt_payload["variables"])
+    if receipt_data is None:
+        try:
+            receipt_resp = post_graphql(receipt_payload, url, headers, timeout=15)
+        except requests.exceptions.Timeout:
+            log(f"Timeout getting receipt HTML for {uuid}", "WARNING")
+            return None
+        except requests.exceptions.RequestException as e:
+            log(f"Network error getting receipt HTML for {uuid}: {e}", "WARNING")
+            return None
+
+        if receipt_resp.status_code != 200:
+            log(f"Receipt HTML request failed for {uuid}: {receipt_resp.status_code}", "ERROR")
             return None
 
-        receipt_info = receipt_data["data"].get("getReceipt")
-        if receipt_info:
-            receipt_html = receipt_info.get("receiptData")
-            if receipt_html:
-                return receipt_html
-            else:
-                log(f"No receipt HTML data for trip {uuid}", "WARNING")
+        receipt_data = decode_json(receipt_resp.content)
+        store_cached_response("GetReceipt", receipt_payload["variables"], receipt_data)
+
+    # Defensive checks
+    if not receipt_data or "data" not in receipt_data or not receipt_data["data"]:
+        log(f"No receipt data returned for {uuid}", "WARNING")
+        return None
+
+    receipt_info = receipt_data["data"].get("getReceipt")
+    if receipt_info:
+        receipt_html = receipt_info.get("receiptData")
+        if receipt_html:
+            return receipt_html
         else:
-            log(f"No receipt info for trip {uuid}", "WARNING")
+            log(f"No receipt HTML data for trip {uuid}", "WARNING")
     else:
-        log(f"Receipt HTML request failed for {uuid}: {receipt_resp.status_code}", "ERROR")
+        log(f"No receipt info for trip {uuid}", "WARNING")
     return None
 
 def merge_receipts(trips, folder="receipts", output_file="all_receipts.pdf"):
     """Merge all trip receipt PDFs into a single file."""
     log(f"Merging {len(trips)} receipts into {output_file}", "INFO")
     
-    merger = PdfMerger()
-
     # Sort trips by time desc
     sorted_trips = sorted(
         trips,
@@ -1041,77 +1926,215 @@ def merge_receipts(trips, folder="receipts", output_file="all_receipts.pdf"):
         reverse=True
     )
 
-    merged_count = 0
+    receipts = []
     for trip in sorted_trips:
         pdf_file = os.path.join(folder, f"{trip['uuid']}.pdf")
         if os.path.exists(pdf_file):
-            merger.append(pdf_file)
-            log(f"Added receipt for {trip['time']}", "INFO")
-            merged_count += 1
+            receipts.append((trip, pdf_file))
         else:
             log(f"Missing PDF for {trip['uuid']} ({trip['time']})", "WARNING")
 
-    if merged_count > 0:
-        with open(output_file, "wb") as f:
-            merger.write(f)
-        merger.close()
-        log(f"Successfully merged {merged_count} receipts into {output_file}", "SUCCESS")
-    else:
+    if not receipts:
         log("No trips available to merge", "WARNING")
+        return
+
+    # Skip the merge when the same receipts were already merged into output_file
+    manifest_file = output_file + RECEIPTS_MANIFEST_SUFFIX
+    fingerprint = receipts_fingerprint([pdf_file for _, pdf_file in receipts])
+    if os.path.exists(output_file) and os.path.exists(manifest_file):
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            if f.read().strip() == fingerprint:
+                log(f"Receipts unchanged since last merge, keeping {output_file}", "SUCCESS")
+                return
+
+    # Drop the old manifest first, and write the PDF under a temporary name that replaces
+    # output_file only once complete, so an interrupted merge is never taken as up to date
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+
+    part_file = output_file + ".part"
+    try:
+        write_merged_pdf(receipts, part_file)
+        os.replace(part_file, output_file)
+    finally:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        f.write(fingerprint)
+
+    log(f"Successfully merged {len(receipts)} receipts into {output_file}", "SUCCESS")
+
+def write_merged_pdf(receipts, output_file):
+    """
+    Write the (trip, pdf_file) receipts into output_file in order.
+    With pikepdf installed, the inputs are parsed in parallel and page streams are copied
+    verbatim instead of being decoded and re-encoded; appending and saving stay serial.
+    """
+    if pikepdf is not None:
+        sources = []
+        try:
+            with ThreadPoolExecutor(max_workers=MAX_PDF_PARSE_WORKERS) as executor:
+                futures = [executor.submit(pikepdf.Pdf.open, pdf_file) for _, pdf_file in receipts]
+            sources = [future.result() for future in futures if future.exception() is None]
+            for future in futures:
+                future.result()  # Re-raise the first parse error (opened files are closed below)
+            log(f"Parsed {len(sources)} receipt PDFs", "INFO")
+
+            with pikepdf.Pdf.new() as merged:
+                # Source files must stay open until the merged file is saved
+                for (trip, _), source in zip(receipts, sources):
+                    merged.pages.extend(source.pages)
+                    log(f"Added receipt for {trip['time']}", "INFO")
+
+                merged.save(
+                    output_file,
+                    compress_streams=False,
+                    stream_decode_level=pikepdf.StreamDecodeLevel.none
+                )
+        finally:
+            for source in sources:
+                source.close()
+        return
+
+    # PdfWriter.append replaces the deprecated PyPDF2 PdfMerger
+    writer = PdfWriter()
+    mapped_files = []
+    try:
+        for trip, pdf_file in receipts:
+            # pypdf seeks around each file while parsing and again while writing; a read-only
+            # memory map serves those reads from the page cache without read() copies
+            with open(pdf_file, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            mapped_files.append(mapped)
+            # strict=False tolerates minor defects in Uber's PDFs instead of re-validating them
+            writer.append(PdfReader(mapped, strict=False))
+            log(f"Added receipt for {trip['time']}", "INFO")
+
+        with open(output_file, "wb") as f:
+            writer.write(f)
+    finally:
+        writer.close()
+        # The maps must stay open until the merged file is written
+        for mapped in mapped_files:
+            mapped.close()
+
+def receipts_fingerprint(pdf_files):
+    """Fingerprint the merge inputs (order, file name and size) to detect an unchanged merge."""
+    entries = [(os.path.basename(pdf_file), os.path.getsize(pdf_file)) for pdf_file in pdf_files]
+    return hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()
 
 
+@lru_cache(maxsize=None)
+def parse_subtitle_datetime(date_str: str):
+    """
+    Parse Uber's subtitle string into a datetime, or None if no known format matches.
+    Cached because the same subtitle is parsed for sorting receipts and for the Excel form.
+    """
+    date_clean = date_str.replace("•", "").strip()
+    match = SUBTITLE_DATE_RE.fullmatch(date_clean)
+    if not match:
+        return None
+
+    month_name, day, year, hour, minute, meridiem = match.groups()
+    month = MONTH_NUMBERS.get(month_name.title())
+    if month is None or not 1 <= int(hour) <= 12:
+        return None
+
+    # 12-hour clock: 12 AM is 00:xx, 12 PM is 12:xx
+    hour = int(hour) % 12 + (12 if meridiem.upper() == "PM" else 0)
+    try:
+        return datetime(int(year) if year else CURRENT_YEAR, month, int(day), hour, int(minute))
+    except ValueError:
+        return None  # e.g. day 31 in a 30-day month
+
 def parse_trip_date(date_str: str):
     """Convert Uber's subtitle string into datetime (adjust format if needed)."""
-    try:
-        # Primary format: "Aug 31 • 4:29 PM"
-        date_clean = date_str.replace("•", "").strip()
-        trip_dt = datetime.strptime(date_clean, "%b %d %I:%M %p")
-        trip_dt = trip_dt.replace(year=datetime.now().year)
-        return trip_dt
-    except Exception:
-        try:
-            # Alternative format: "Aug 31, 2025, 10:15 AM"
-            return datetime.strptime(date_str, "%b %d, %Y, %I:%M %p")
-        except Exception as e:
-            log(f"Failed to parse date '{date_str}': {e}", "WARNING")
-            return datetime.min    
+    trip_dt = parse_subtitle_datetime(date_str)
+    if trip_dt is None:
+        log(f"Failed to parse date '{date_str}'", "WARNING")
+        return datetime.min
+    return trip_dt
 
 # ============================================================================
 # EMAIL AND ZIP FUNCTIONS
 # ============================================================================
 
-def create_zip_archive(source_folder, zip_filename):
+def get_zip_compression(email_config):
+    """
+    Resolve the ZIP compression method and level from the email configuration.
+    
+    Args:
+        email_config (dict): Email configuration from config.json
+    
+    Returns:
+        tuple: (compression, compresslevel) to pass to zipfile.ZipFile
+    """
+    method = str(email_config.get('zip_compression', 'deflate')).lower()
+    
+    if method == 'zstd':
+        if ZIP_ZSTANDARD is not None:
+            return ZIP_ZSTANDARD, email_config.get('zip_compress_level', 3)
+        log("Zstandard ZIP compression needs Python 3.14+, using DEFLATE instead", "WARNING")
+        # A Zstandard level may be outside DEFLATE's 0-9 range
+        return zipfile.ZIP_DEFLATED, 1
+    elif method != 'deflate':
+        log(f"Unknown zip_compression '{method}', using DEFLATE instead", "WARNING")
+    
+    # The archive is emailed once and deleted, and the receipts PDF and Excel file are
+    # already compressed, so level 1 is much faster for almost the same size
+    return zipfile.ZIP_DEFLATED, email_config.get('zip_compress_level', 1)
+
+def create_zip_archive(source_folder, zip_filename, compression=zipfile.ZIP_DEFLATED, compresslevel=None):
     """
-    Create a ZIP archive of the specified folder.
+    Create a ZIP archive of the specified folder in memory.
+    
+    The archive is attached to the email straight from memory, so it is only
+    written to disk if it has to be kept for manual sending.
     
     Args:
         source_folder (str): Path to the folder to compress
-        zip_filename (str): Name of the output ZIP file
+        zip_filename (str): Name of the ZIP file (used in logs)
+        compression (int): zipfile compression method (see get_zip_compression)
+        compresslevel (int): Compression level, or None for the method's default
     
     Returns:
-        str: Path to the created ZIP file or None if failed
+        bytes: Contents of the created ZIP file or None if failed
     """
-    log(f"Creating ZIP archive: {zip_filename}", "INFO")
+    method_name = "Zstandard" if compression == ZIP_ZSTANDARD else "DEFLATE"
+    log(f"Creating ZIP archive: {zip_filename} ({method_name})", "INFO")
     
     try:
-        with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        # Entries are stored relative to the folder's parent so they unpack into the month folder
+        archive_root = os.path.dirname(source_folder)
+        
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', compression, compresslevel=compresslevel) as zip_file:
             # Walk through all files in the source folder
             for root, dirs, files in os.walk(source_folder):
                 for file in files:
+                    # Merge bookkeeping is not part of the report
+                    if file.endswith(RECEIPTS_MANIFEST_SUFFIX):
+                        continue
                     file_path = os.path.join(root, file)
                     # Calculate the relative path for the file in the ZIP
-                    arcname = os.path.relpath(file_path, os.path.dirname(source_folder))
-                    zip_file.write(file_path, arcname)
-                    log(f"Added to ZIP: {arcname}", "INFO")
+                    arcname = os.path.relpath(file_path, archive_root)
+                    # PDF streams and XLSX parts are already deflated; recompressing them gains nothing
+                    if file.lower().endswith(ZIP_STORED_EXTENSIONS):
+                        zip_file.write(file_path, arcname, compress_type=zipfile.ZIP_STORED)
+                    else:
+                        zip_file.write(file_path, arcname)
+            
+            # One summary line instead of a line per file
+            entries = zip_file.infolist()
+            total_bytes = sum(entry.file_size for entry in entries)
+            stored_count = sum(1 for entry in entries if entry.compress_type == zipfile.ZIP_STORED)
+            log(f"Added {len(entries)} files ({total_bytes / (1024*1024):.1f} MB) to ZIP, "
+                f"{stored_count} stored without recompressing", "INFO")
         
-        # Check if ZIP file was created and get its size
-        if os.path.exists(zip_filename):
-            zip_size = os.path.getsize(zip_filename)
-            log(f"ZIP archive created successfully: {zip_filename} ({zip_size / (1024*1024):.1f} MB)", "SUCCESS")
-            return zip_filename
-        else:
-            log("ZIP file was not created", "ERROR")
-            return None
+        zip_data = zip_buffer.getvalue()
+        log(f"ZIP archive created successfully: {zip_filename} ({len(zip_data) / (1024*1024):.1f} MB)", "SUCCESS")
+        return zip_data
             
     except Exception as e:
         log(f"Error creating ZIP archive: {e}", "ERROR")
@@ -1121,43 +2144,75 @@ def validate_email_address(email):
     """
     Basic email validation.
     
+    The address must be a bare ASCII "local@domain.tld" (no display name), since
+    the sender address is also used as the SMTP login.
+    
     Args:
         email (str): Email address to validate
     
     Returns:
         bool: True if email is valid, False otherwise
     """
-    import re
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    name, address = parseaddr(email)
+    if name or address != email or not address.isascii() or any(c.isspace() for c in address):
+        return False
+    
+    local, _, domain = address.rpartition('@')
+    # Every domain label must be non-empty ("a@.com" and "a@b.com." are rejected)
+    return bool(local) and '.' in domain and all(domain.split('.'))
 
-def send_email_with_attachment(email_config, zip_file_path, month_year, total_amount, trip_count):
+@lru_cache(maxsize=1)
+def get_email_sender(host, port, username, password):
     """
-    Send email with ZIP file attachment using Red Mail.
+    Create a Red Mail EmailSender and open its SMTP connection.
+    
+    The sender is cached per account, so later emails in the same run reuse the
+    authenticated connection instead of repeating the STARTTLS and login handshake.
+    The connection is closed when the script exits.
+    
+    Returns:
+        EmailSender: Connected email sender
+    """
+    log(f"Connecting to SMTP server: {host}:{port}", "INFO")
+    
+    email_sender = EmailSender(
+        host=host,
+        port=port,
+        username=username,
+        password=password,
+        use_starttls=True  # Use STARTTLS for security
+    )
+    email_sender.connect()
+    
+    def close_connection():
+        try:
+            email_sender.close()
+        except Exception:
+            pass  # The server may already have dropped the idle connection
+    
+    atexit.register(close_connection)
+    return email_sender
+
+def validate_email_config(email_config):
+    """
+    Check that Red Mail is installed and the email settings are complete and valid.
     
     Args:
         email_config (dict): Email configuration from config.json
-        zip_file_path (str): Path to the ZIP file to attach
-        month_year (str): Month-year string for email subject/body
-        total_amount (float): Total trip amount for email body
-        trip_count (int): Number of trips for email body
     
     Returns:
-        bool: True if email sent successfully, False otherwise
+        bool: True if an email can be sent with this configuration
     """
-    log("Preparing to send email with ZIP attachment using Red Mail", "INFO")
-    
     # Check if Red Mail is available
     if EmailSender is None:
         log("Red Mail library not installed. Please install it with: pip install redmail", "ERROR")
         return False
     
     # Validate email configuration
-    required_fields = ['recipient_email', 'sender_email', 'sender_password', 'smtp_server', 'smtp_port']
-    for field in required_fields:
-        if field not in email_config or not email_config[field]:
-            log(f"Missing required email configuration: {field}", "ERROR")
-            return False
+    missing_fields = [field for field in EMAIL_REQUIRED_FIELDS if not email_config.get(field)]
+    if missing_fields:
+        log(f"Missing required email configuration: {', '.join(missing_fields)}", "ERROR")
+        return False
     
     # Validate email addresses
     if not validate_email_address(email_config['recipient_email']):
@@ -1168,55 +2223,75 @@ def send_email_with_attachment(email_config, zip_file_path, month_year, total_am
         log(f"Invalid sender email: {email_config['sender_email']}", "ERROR")
         return False
     
-    # Check if ZIP file exists
-    if not os.path.exists(zip_file_path):
-        log(f"ZIP file not found: {zip_file_path}", "ERROR")
+    return True
+
+def preconnect_email_sender(email_config):
+    """
+    Open the SMTP connection ahead of sending so the handshake overlaps other work.
+    
+    Only call this after validate_email_config() has passed. Failures are only
+    logged here; send_email_with_attachment() connects again and reports the
+    error with troubleshooting hints.
+    """
+    try:
+        get_email_sender(
+            email_config['smtp_server'],
+            email_config['smtp_port'],
+            email_config['sender_email'],
+            email_config['sender_password']
+        )
+    except Exception as e:
+        log(f"Could not connect to SMTP server in advance: {e}", "WARNING")
+
+def send_email_with_attachment(email_config, zip_filename, zip_data, month_year, total_amount, trip_count):
+    """
+    Send email with ZIP file attachment using Red Mail.
+    
+    Args:
+        email_config (dict): Email configuration from config.json
+        zip_filename (str): File name of the ZIP attachment
+        zip_data (bytes): Contents of the ZIP file to attach
+        month_year (str): Month-year string for email subject/body
+        total_amount (float): Total trip amount for email body
+        trip_count (int): Number of trips for email body
+    
+    Returns:
+        bool: True if email sent successfully, False otherwise
+    """
+    log("Preparing to send email with ZIP attachment using Red Mail", "INFO")
+    
+    if not validate_email_config(email_config):
+        return False
+    
+    # Check that there is a ZIP file to attach
+    if not zip_data:
+        log(f"ZIP file is empty: {zip_filename}", "ERROR")
         return False
     
     try:
-        # Initialize Red Mail EmailSender
-        log(f"Connecting to SMTP server: {email_config['smtp_server']}:{email_config['smtp_port']}", "INFO")
-        
-        email_sender = EmailSender(
-            host=email_config['smtp_server'],
-            port=email_config['smtp_port'],
-            username=email_config['sender_email'],
-            password=email_config['sender_password'],
-            use_starttls=True  # Use STARTTLS for security
+        # Red Mail EmailSender with an open SMTP connection (reused for further emails)
+        email_sender = get_email_sender(
+            email_config['smtp_server'],
+            email_config['smtp_port'],
+            email_config['sender_email'],
+            email_config['sender_password']
         )
         
-        # Format subject
-        subject_template = email_config.get('subject_template', 'Uber Trip Report - {month_year}')
-        subject = subject_template.format(month_year=month_year)
+        # Values shared by the subject, text body and HTML body (total_amount stays a float
+        # so templates can format it, e.g. {total_amount:.2f})
+        template_values = {
+            'month_year': month_year,
+            'total_amount': total_amount,
+            'trip_count': trip_count
+        }
         
-        # Format body
-        body_template = email_config.get('body_template', 
-            'Please find attached the Uber trip report for {month_year}.\n\n'
-            'Total amount: ${total_amount}\n'
-            'Number of trips: {trip_count}\n\n'
-            'Best regards,\n'
-            'Uber Trip Exporter')
+        subject = email_config.get('subject_template', DEFAULT_SUBJECT_TEMPLATE).format_map(template_values)
+        body = email_config.get('body_template', DEFAULT_BODY_TEMPLATE).format_map(template_values)
         
-        body = body_template.format(
-            month_year=month_year,
-            total_amount=total_amount,
-            trip_count=trip_count
-        )
-        
-        # HTML version of the body for better formatting
-        html_body = f"""
-        <html>
-        <body>
-            <h2>Uber Trip Report - {month_year}</h2>
-            <p>Please find attached the Uber trip report for <strong>{month_year}</strong>.</p>
-            <ul>
-                <li><strong>Total amount:</strong> ${total_amount}</li>
-                <li><strong>Number of trips:</strong> {trip_count}</li>
-            </ul>
-            <p>Best regards,<br>Uber Trip Exporter</p>
-        </body>
-        </html>
-        """
+        # HTML version of the body for better formatting (plain text only if send_html is false)
+        html_body = None
+        if email_config.get('send_html', True):
+            html_body = DEFAULT_HTML_TEMPLATE.format_map(template_values)
         
         log(f"Sending email to: {email_config['recipient_email']}", "INFO")
         
@@ -1228,7 +2303,7 @@ def send_email_with_attachment(email_config, zip_file_path, month_year, total_am
             text=body,
             html=html_body,
             attachments={
-                os.path.basename(zip_file_path): Path(zip_file_path)
+                zip_filename: zip_data
             }
         )
         
@@ -1249,6 +2324,126 @@ def send_email_with_attachment(email_config, zip_file_path, month_year, total_am
         
         return False    
 
+# ============================================================================
+# REPORT STAGE FUNCTIONS
+# ============================================================================
+
+def save_trips_file(trips_file, trips, overall_amount, month_year, start_time_ms, end_time_ms):
+    """Checkpoint fetched trips to trips.json so later stages can be re-run without the API."""
+    # Calculate total subtracted fees for review
+    total_subtracted_fees = sum(trip.get("subtracted_fees_total", 0.0) for trip in trips)
+    
+    # Save trips data with month prefix
+    log("Saving trip data to JSON file", "INFO")
+    write_json_file(trips_file, {
+        "overall_amount": round(overall_amount, 2),
+        "total_subtracted_fees": round(total_subtracted_fees, 2),  # For reviewing
+        "reimbursable_amount": round(overall_amount - total_subtracted_fees, 2),  # What company pays
+        "trips": trips,
+        "month_year": month_year,
+        "date_range": {
+            "start": start_time_ms,
+            "end": end_time_ms
+        }
+    })
+
+    log(f"Saved {len(trips)} trips to {trips_file} (total: ${overall_amount:.2f})", "SUCCESS")
+
+def load_trips_file(trips_file):
+    """
+    Load trips previously saved by save_trips_file().
+
+    Returns:
+        tuple: (trips, overall_amount) - empty if the file is missing or invalid
+    """
+    log(f"Loading saved trip data from {trips_file}", "INFO")
+    
+    if not os.path.exists(trips_file):
+        log(f"No saved trip data found: {trips_file}", "ERROR")
+        log("Run the script without --reuse-trips to fetch trips from Uber first", "INFO")
+        return [], 0.0
+    
+    try:
+        with open(trips_file, "rb") as f:
+            data = decode_json(f.read())
+    except (OSError, ValueError) as e:
+        log(f"Could not read saved trip data: {e}", "ERROR")
+        return [], 0.0
+    
+    trips = data.get("trips", [])
+    overall_amount = data.get("overall_amount", 0.0)
+    log(f"Loaded {len(trips)} trips from {trips_file} (total: ${overall_amount:.2f})", "SUCCESS")
+    return trips, overall_amount
+
+def build_receipts_pdf(trips, receipts_file):
+    """Merge the downloaded receipts into the monthly PDF and remove the temporary folder."""
+    # Merge receipts with month-specific filename
+    merge_receipts(trips, output_file=receipts_file)
+    
+    # Clean up temporary receipts folder (receipts stay in the cache kept between runs)
+    cleanup_temp_receipts_folder()
+    prune_receipt_cache()
+
+def write_claim_form(trips, month_year, output_folder, home_keywords, work_keywords):
+    """Fill a monthly copy of the Excel claim form. Returns the path of the filled form."""
+    # Load the Excel template (original file name)
+    template_excel_file = "Private_Taxi_Claim_Form.xlsx"
+
+    # Monthly copy of the Excel file, named using the calculated month_year
+    excel_file = get_monthly_excel_path(template_excel_file, month_year, output_folder)
+
+    process_excel_file(excel_file, trips, template_excel_file, home_keywords, work_keywords)
+    return excel_file
+
+def send_report(email_config, output_folder, month_year, overall_amount, trip_count):
+    """Compress the monthly folder and email it if email is enabled in the config."""
+    # Create ZIP archive and send email if enabled
+    if email_config and email_config.get('enabled', False):
+        log("Creating ZIP archive for email...", "INFO")
+        zip_filename = f"{month_year}_uber_trip_report.zip"
+        compression, compresslevel = get_zip_compression(email_config)
+        
+        # Validate the settings before logging in, so a bad config never opens a connection
+        email_ready = validate_email_config(email_config)
+        
+        # Log in to the SMTP server while the archive is being built
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            if email_ready:
+                executor.submit(preconnect_email_sender, email_config)
+            zip_data = create_zip_archive(output_folder, zip_filename, compression, compresslevel)
+        
+        if zip_data:
+            email_sent = False
+            if email_ready:
+                log("Sending email with ZIP attachment...", "INFO")
+                email_sent = send_email_with_attachment(
+                    email_config, 
+                    zip_filename, 
+                    zip_data, 
+                    month_year, 
+                    overall_amount, 
+                    trip_count
+                )
+            
+            if email_sent:
+                log("Email sent successfully! 📧", "SUCCESS")
+            else:
+                # The archive only existed in memory; keep a copy for manual sending
+                try:
+                    with open(zip_filename, "wb") as f:
+                        f.write(zip_data)
+                    log("Failed to send email. ZIP file saved for manual sending.", "WARNING")
+                    log(f"ZIP file location: {zip_filename}", "INFO")
+                except OSError as e:
+                    log(f"Failed to send email and could not save ZIP file: {e}", "ERROR")
+        else:
+            log("Failed to create ZIP archive. Email not sent.", "ERROR")
+    else:
+        if email_config and not email_config.get('enabled', False):
+            log("Email functionality is disabled in config. Set 'enabled' to true to send emails.", "INFO")
+        else:
+            log("No email configuration found. Files saved locally only.", "INFO")
+
 # ============================================================================
 # MAIN EXECUTION FUNCTION
 # ============================================================================
@@ -1258,117 +2453,68 @@ def main():
     log("🚀 Starting Uber Trip Exporter", "HEADER")
     
     # Parse command line arguments
-    target_month = parse_command_line_args()
+    target_month, reuse_trips = parse_command_line_args()
     
     # Get date range for the target month
     start_time_ms, end_time_ms, month_year = get_month_date_range(target_month)
     
-    # Read authentication token
-    cookie = read_token_from_file()
-    
     # Load configuration for fare breakdown
     log("Loading configuration from config.json", "INFO")
     home_address_keywords, work_address_keywords, email_config = read_config_from_file()
     config = read_config_from_file(return_full_config=True)
     
-    # Fetch trips from Uber API (with receipts using improved timeout handling)
-    trips, overall_amount = get_uber_trips(cookie, start_time_ms, end_time_ms, config, download_receipts=True)
+    # Create month-specific output file paths
+    output_folder = month_year
+    monthly_receipts_file = os.path.join(output_folder, "all_receipts.pdf")
+    monthly_trips_file = os.path.join(output_folder, "trips.json")
+    
+    # Stage 1: trip data - fetched from Uber, or reloaded from a previous run's checkpoint
+    if reuse_trips:
+        trips, overall_amount = load_trips_file(monthly_trips_file)
+    else:
+        # Read authentication token
+        try:
+            cookie = read_token_from_file()
+        except RuntimeError:
+            sys.exit(1)
+        
+        # Fetch trips from Uber API (with receipts using improved timeout handling)
+        trips, overall_amount = get_uber_trips(cookie, start_time_ms, end_time_ms, config, download_receipts=True)
     
     if not trips:
         log("No trips found for the specified period", "WARNING")
         return
     
     # Create month-specific output folder
-    output_folder = month_year
     os.makedirs(output_folder, exist_ok=True)
     log(f"Created output folder: {output_folder}", "SUCCESS")
 
-    # Create month-specific output file paths
-    monthly_receipts_file = os.path.join(output_folder, "all_receipts.pdf")
-    monthly_trips_file = os.path.join(output_folder, "trips.json")
-
-    # Calculate total subtracted fees for review
-    total_subtracted_fees = sum(trip.get("subtracted_fees_total", 0.0) for trip in trips)
-    
-    # Save trips data with month prefix
-    log("Saving trip data to JSON file", "INFO")
-    with open(monthly_trips_file, "w", encoding="utf-8") as f:
-        json.dump({
-            "overall_amount": round(overall_amount, 2),
-            "total_subtracted_fees": round(total_subtracted_fees, 2),  # For reviewing
-            "reimbursable_amount": round(overall_amount - total_subtracted_fees, 2),  # What company pays
-            "trips": trips,
-            "month_year": month_year,
-            "date_range": {
-                "start": start_time_ms,
-                "end": end_time_ms
-            }
-        }, f, ensure_ascii=False, indent=2)
-
-    log(f"Saved {len(trips)} trips to {monthly_trips_file} (total: ${overall_amount:.2f})", "SUCCESS")
+    if not reuse_trips:
+        save_trips_file(monthly_trips_file, trips, overall_amount, month_year, start_time_ms, end_time_ms)
     
-    # Merge receipts with month-specific filename
-    merge_receipts(trips, output_file=monthly_receipts_file)
-    
-    # Clean up temporary receipts folder
-    cleanup_temp_receipts_folder()
-
-    # Load the Excel template (original file name)
-    template_excel_file = "Private_Taxi_Claim_Form.xlsx"
-
-    # Create a monthly copy of the Excel file using the calculated month_year
-    excel_file = create_monthly_excel_copy(template_excel_file, month_year, output_folder)
+    # Stage 2: merged receipts (kept as-is when reusing saved trips)
+    if reuse_trips and os.path.exists(monthly_receipts_file):
+        log(f"Keeping existing merged receipts: {monthly_receipts_file}", "INFO")
+    else:
+        build_receipts_pdf(trips, monthly_receipts_file)
 
-    # Process Excel file
+    # Stage 3: Excel claim form
     try:
-        process_excel_file(excel_file, trips, template_excel_file, home_address_keywords, work_address_keywords)
-        
-        log("Monthly report completed successfully!", "HEADER")
-        log(f"All files saved in folder: {output_folder}", "SUCCESS")
-        log("Files created:", "INFO")
-        log("  - trips.json (trip data)", "INFO")
-        log("  - all_receipts.pdf (merged receipts)", "INFO")
-        log(f"  - {month_year}_Private_Taxi_Claim_Form.xlsx (claim form)", "INFO")
-        
-        # Create ZIP archive and send email if enabled
-        if email_config and email_config.get('enabled', False):
-            log("Creating ZIP archive for email...", "INFO")
-            zip_filename = f"{month_year}_uber_trip_report.zip"
-            zip_path = create_zip_archive(output_folder, zip_filename)
-            
-            if zip_path:
-                log("Sending email with ZIP attachment...", "INFO")
-                email_sent = send_email_with_attachment(
-                    email_config, 
-                    zip_path, 
-                    month_year, 
-                    overall_amount, 
-                    len(trips)
-                )
-                
-                if email_sent:
-                    log("Email sent successfully! 📧", "SUCCESS")
-                    
-                    # Optionally clean up the ZIP file after sending
-                    try:
-                        os.remove(zip_path)
-                        log(f"Cleaned up ZIP file: {zip_path}", "INFO")
-                    except Exception as e:
-                        log(f"Could not clean up ZIP file: {e}", "WARNING")
-                else:
-                    log("Failed to send email. ZIP file preserved for manual sending.", "WARNING")
-                    log(f"ZIP file location: {zip_path}", "INFO")
-            else:
-                log("Failed to create ZIP archive. Email not sent.", "ERROR")
-        else:
-            if email_config and not email_config.get('enabled', False):
-                log("Email functionality is disabled in config. Set 'enabled' to true to send emails.", "INFO")
-            else:
-                log("No email configuration found. Files saved locally only.", "INFO")
-        
+        write_claim_form(trips, month_year, output_folder, home_address_keywords, work_address_keywords)
     except Exception as e:
         log(f"Error processing Excel file: {e}", "ERROR")
+        log(f"Trip data is saved in {monthly_trips_file}. Fix the issue and re-run with --reuse-trips", "INFO")
         raise
+    
+    log("Monthly report completed successfully!", "HEADER")
+    log(f"All files saved in folder: {output_folder}", "SUCCESS")
+    log("Files created:", "INFO")
+    log("  - trips.json (trip data)", "INFO")
+    log("  - all_receipts.pdf (merged receipts)", "INFO")
+    log(f"  - {month_year}_Private_Taxi_Claim_Form.xlsx (claim form)", "INFO")
+    
+    # Stage 4: ZIP and email
+    send_report(email_config, output_folder, month_year, overall_amount, len(trips))
 
 
 if __name__ == "__main__":